@@ -0,0 +1,248 @@
+"""Backtest the notification rules against archived weather.
+
+Replays Open-Meteo historical hourly files (the archive API's JSON, one
+location per file or a list of locations per file) for every night they
+cover. Each site's nights are scored together as arrays. Each night's sun,
+moon and sidereal time come from ephem once. Conditions are scored for all
+nights in one pass, and the snapshot target scores form a targets x nights
+matrix. The report gives how often we would have notified, by site and by
+month, and how that moves across a grid of MIN_CONDITIONS_SCORE and
+MIN_TARGET_SCORE values, or with an alternative scoring file.
+
+    python backtest.py archive/*.json
+    python backtest.py archive/*.json --rules looser.json --check 20
+
+Archive files are fetched from https://archive-api.open-meteo.com/v1/archive
+with hourly=cloud_cover,relative_humidity_2m,wind_speed_10m and the site's
+timezone; wind is converted from the file's hourly_units.
+"""
+
+import argparse
+import json
+from datetime import date, timedelta
+import ephem
+import numpy as np
+import pytz
+from config import MIN_ALTITUDE, MIN_CONDITIONS_SCORE, MIN_TARGET_SCORE
+from catalog import DIFFICULTY_NAMES
+from horizon import clear_of
+from night import NightContext
+from results import round_exact
+from scoring import conditions_score_array, load_rules, target_score_array
+from sky import apparent_place, horizontal, unit_vectors
+
+WIND_TO_MPH = {"mph": 1.0, "km/h": 0.621371, "m/s": 2.236936, "kn": 1.150779}
+
+
+def load_archives(paths: list) -> list:
+    """Sites from archive files: lat, lon, timezone, hour index and weather arrays."""
+    sites = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        for entry in data if isinstance(data, list) else [data]:
+            hourly = entry["hourly"]
+            wind_unit = entry.get("hourly_units", {}).get("wind_speed_10m", "mph")
+            sites.append({
+                "source": path,
+                "lat": float(entry["latitude"]),
+                "lon": float(entry["longitude"]),
+                "timezone": entry.get("timezone", "GMT"),
+                "hours": {t: i for i, t in enumerate(hourly["time"])},
+                # Missing hours (null in the archive) become NaN and count as no forecast
+                "cloud_cover": np.array(hourly["cloud_cover"], dtype=float),
+                "humidity": np.array(hourly["relative_humidity_2m"], dtype=float),
+                "wind_mph": np.array(hourly["wind_speed_10m"], dtype=float) * WIND_TO_MPH[wind_unit],
+                "first": hourly["time"][0][:10],
+                "last": hourly["time"][-1][:10],
+            })
+    return sites
+
+
+def local_hour(when, tz) -> str:
+    """Archive time string ("YYYY-MM-DDTHH:00") of the hour containing an ephem date."""
+    return ephem.Date(when).datetime().replace(tzinfo=pytz.UTC).astimezone(tz).strftime("%Y-%m-%dT%H:00")
+
+
+def nightly_sky(lat: float, lon: float, evenings: list) -> dict:
+    """Viewing time, sidereal time and Moon for each evening (ephem, once per night)."""
+    n = len(evenings)
+    sky = {k: np.empty(n) for k in ("viewing_time", "lst", "moon_ra", "moon_dec", "moon_phase", "moon_alt")}
+    for i, evening in enumerate(evenings):
+        ctx = NightContext(lat, lon, evening)
+        moon = ctx.moon
+        sky["viewing_time"][i] = ctx.viewing_time
+        sky["lst"][i] = ctx.observer().sidereal_time()
+        sky["moon_ra"][i], sky["moon_dec"][i] = moon.ra, moon.dec
+        sky["moon_phase"][i], sky["moon_alt"][i] = moon.phase, moon.alt
+    return sky
+
+
+def best_target_scores(lat: float, lon: float, sky: dict, catalog: np.ndarray, rules: dict | None = None,
+                       horizon: np.ndarray | None = None) -> np.ndarray:
+    """Best snapshot target score per night, 0 if nothing is visible (as targets.score_targets).
+
+    Positions, moon separations and scores are targets x nights arrays; only
+    the apparent-place rotation is evaluated night by night.
+    """
+    n = len(sky["lst"])
+    app_ra = np.empty((len(catalog), n))
+    app_dec = np.empty((len(catalog), n))
+    for i, when in enumerate(sky["viewing_time"]):
+        app_ra[:, i], app_dec[:, i] = apparent_place(catalog["ra"], catalog["dec"], when)
+
+    obs = NightContext(lat, lon).observer(sky["viewing_time"][0])  # Site and refraction settings only
+    alt, az = horizontal(obs, app_ra, app_dec, sky["lst"][None, :])
+    altitude = np.degrees(alt)
+    visible = altitude > MIN_ALTITUDE
+    if horizon is not None:
+        visible &= clear_of(np.maximum(horizon, MIN_ALTITUDE), altitude, az)
+
+    # Moon separation, same formula as sky.separation
+    vec = unit_vectors(app_ra, app_dec)
+    ref = unit_vectors(sky["moon_ra"], sky["moon_dec"])[:, None, :]
+    cross = np.linalg.norm(np.cross(ref, vec, axis=0), axis=0)
+    separation = np.degrees(np.arctan2(cross, np.sum(ref * vec, axis=0)))
+
+    scores = target_score_array(round_exact(altitude), round_exact(separation), sky["moon_phase"][None, :],
+                                DIFFICULTY_NAMES[catalog["difficulty"]][:, None], rules=rules)
+    return np.where(visible, round_exact(scores), 0.0).max(axis=0, initial=0.0)
+
+
+def backtest_site(site: dict, catalog: np.ndarray, start: date | None = None, end: date | None = None,
+                  rules: dict | None = None, horizon: np.ndarray | None = None) -> dict:
+    """Conditions score and best target score for every evening the archive covers.
+
+    Args:
+        site: one entry from load_archives
+        catalog: catalog array (see catalog.CATALOG_DTYPE)
+        start, end: optional first/last evening to replay
+        rules: scoring rules (default: scoring.load_rules())
+        horizon: optional per-azimuth altitude limits (see horizon.py)
+
+    Returns:
+        dict of per-night values: evening (dates), hour (archive index, -1 if
+        missing), has_weather, conditions and best_target arrays
+    """
+    rules = rules or load_rules()
+    first = max(date.fromisoformat(site["first"]), start or date.min)
+    last = min(date.fromisoformat(site["last"]), end or date.max)
+    evenings = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    sky = nightly_sky(site["lat"], site["lon"], evenings)
+
+    # Archive hour containing each viewing time, in the archive's own timezone
+    tz = pytz.timezone(site["timezone"])
+    hour = np.array([site["hours"].get(local_hour(vt, tz), -1) for vt in sky["viewing_time"]], dtype=int)
+    values = {name: np.where(hour >= 0, site[name][hour], np.nan) for name in ("cloud_cover", "humidity", "wind_mph")}
+    has_weather = ~np.isnan(values["cloud_cover"] + values["humidity"] + values["wind_mph"])
+    # get_moon_info rounds the phase to 0.1% and calls the moon up above 0 degrees
+    values["moon_phase"] = round_exact(sky["moon_phase"])
+    conditions = conditions_score_array(values, sky["moon_alt"] > 0, rules=rules)
+
+    return {
+        "evening": evenings,
+        "hour": hour,
+        "has_weather": has_weather,
+        "conditions": np.where(has_weather, conditions, 0),
+        "best_target": best_target_scores(site["lat"], site["lon"], sky, catalog, rules, horizon),
+    }
+
+
+def notify_mask(result: dict, min_conditions: float = MIN_CONDITIONS_SCORE,
+                min_target: float = MIN_TARGET_SCORE) -> np.ndarray:
+    """Nights main.decide would have notified on."""
+    return result["has_weather"] & (result["conditions"] >= min_conditions) & (result["best_target"] >= min_target)
+
+
+def sweep(results: list, conditions_thresholds, target_thresholds) -> np.ndarray:
+    """Notify rate over all nights with weather, for each (conditions, target) threshold pair.
+
+    Returns:
+        Array of rates, conditions thresholds x target thresholds
+    """
+    valid = np.concatenate([r["has_weather"] for r in results])
+    conditions = np.concatenate([r["conditions"] for r in results])[valid]
+    best = np.concatenate([r["best_target"] for r in results])[valid]
+    c = np.asarray(conditions_thresholds)[:, None, None]
+    t = np.asarray(target_thresholds)[None, :, None]
+    hits = (conditions >= c) & (best >= t)
+    return hits.sum(axis=2) / max(1, len(conditions))
+
+
+def check(site: dict, result: dict, catalog: np.ndarray, nights: int, seed: int = 0) -> int:
+    """Replay random nights through the live path (main.decide) and count disagreements."""
+    from main import decide
+    from moon import get_moon_info
+    from targets import get_recommendations
+
+    rng = np.random.default_rng(seed)
+    candidates = np.flatnonzero(result["has_weather"])
+    notify = notify_mask(result)
+    mismatches = 0
+    for i in rng.choice(candidates, size=min(nights, len(candidates)), replace=False):
+        ctx = NightContext(site["lat"], site["lon"], result["evening"][i])
+        weather = {k: float(site[k][result["hour"][i]]) for k in ("cloud_cover", "humidity", "wind_mph")}
+        targets = get_recommendations("snapshot", ctx=ctx, catalog=catalog)
+        decision = decide(weather, get_moon_info(ctx), targets)
+        best = targets[0]["score"] if len(targets) else 0.0
+        if (decision["conditions_score"], decision["notify"], best) != \
+                (result["conditions"][i], notify[i], result["best_target"][i]):
+            mismatches += 1
+            print(f"  mismatch {result['evening'][i]}: live {decision['conditions_score']}/{best}, "
+                  f"batch {result['conditions'][i]}/{result['best_target'][i]}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import time
+    from targets import get_catalog, get_candidates, get_horizon
+
+    parser = argparse.ArgumentParser(description="Replay archived weather through the notification rules.")
+    parser.add_argument("archives", nargs="+", help="Open-Meteo archive JSON files")
+    parser.add_argument("--start", type=date.fromisoformat, help="first evening")
+    parser.add_argument("--end", type=date.fromisoformat, help="last evening")
+    parser.add_argument("--rules", help="alternative scoring JSON (see scoring.py) to compare against")
+    parser.add_argument("--check", type=int, default=0, help="replay N random nights per site through main.decide")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    sites = load_archives(args.archives)
+    horizon = get_horizon()
+    min_alt = MIN_ALTITUDE if horizon is None else horizon.min()
+    catalogs = [get_candidates(s["lat"], get_catalog(), min_alt) for s in sites]
+    results = [backtest_site(s, c, args.start, args.end, horizon=horizon) for s, c in zip(sites, catalogs)]
+    nights = sum(len(r["evening"]) for r in results)
+    print(f"{len(sites)} sites, {nights} nights in {time.perf_counter() - began:.2f}s\n")
+
+    print(f"Notify rate at MIN_CONDITIONS_SCORE={MIN_CONDITIONS_SCORE}, MIN_TARGET_SCORE={MIN_TARGET_SCORE}:")
+    for site, r in zip(sites, results):
+        hits, valid = notify_mask(r).sum(), r["has_weather"].sum()
+        print(f"  {site['lat']:8.4f} {site['lon']:9.4f}  {hits:4d}/{valid:4d} nights ({hits / max(1, valid):.0%})")
+
+    months = {}
+    for r in results:
+        for evening, valid, hit in zip(r["evening"], r["has_weather"], notify_mask(r)):
+            total, count = months.get(evening.month, (0, 0))
+            months[evening.month] = (total + int(valid), count + int(hit))
+    print("\nBy month: " + "  ".join(f"{date(2000, m, 1):%b} {c / max(1, t):.0%}"
+                                     for m, (t, c) in sorted(months.items())))
+
+    conditions_grid, target_grid = list(range(4, 10)), [5, 6, 7, 8, 9]
+    rates = sweep(results, conditions_grid, target_grid)
+    print("\nNotify rate by threshold (rows: MIN_CONDITIONS_SCORE, columns: MIN_TARGET_SCORE)")
+    print("      " + "".join(f"{t:>7}" for t in target_grid))
+    for c, row in zip(conditions_grid, rates):
+        print(f"  {c:>2}  " + "".join(f"{v:>7.0%}" for v in row))
+
+    if args.rules:
+        rules = load_rules(args.rules)
+        alt = [backtest_site(s, c, args.start, args.end, rules=rules, horizon=horizon)
+               for s, c in zip(sites, catalogs)]
+        before = sum(notify_mask(r).sum() for r in results)
+        after = sum(notify_mask(r).sum() for r in alt)
+        changed = sum((notify_mask(a) != notify_mask(r)).sum() for a, r in zip(alt, results))
+        print(f"\nWith {args.rules}: {after} notifications vs {before} ({changed} nights change)")
+
+    if args.check:
+        bad = sum(check(s, r, c, args.check) for s, r, c in zip(sites, results, catalogs))
+        print(f"\nReplayed {args.check} nights per site through main.decide: {bad} mismatches")
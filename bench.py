@@ -0,0 +1,270 @@
+"""Offline benchmark suite for the pipeline stages.
+
+Runs with a fixed night and a synthetic forecast (no network), scales
+synthetic catalogs and time grids, and records wall time, peak memory and
+function calls per stage as JSON. `compare` flags regressions between runs.
+
+    python bench.py run --out bench.json
+    python bench.py compare old.json new.json
+    python bench.py startup
+"""
+
+import argparse
+import cProfile
+import contextlib
+import io
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+import ephem
+import numpy as np
+import main
+import notifier
+import weather
+from catalog import CATALOG_DTYPE, DIFFICULTY_NAMES, TYPE_NAMES
+from moon import get_moon_info
+from config import LATITUDE, LONGITUDE
+from night import LOCAL_TZ, NightContext
+from sky import visibility_grid
+from targets import get_recommendations
+
+BENCH_NIGHT = date(2025, 1, 15)
+BENCH_SITE = (28.2336, -82.1812)
+CATALOG_SIZES = (78, 1000, 10000, 100000)
+GRID_STEPS = (1, 10, 100, 300)
+
+# A cloudy "no notification" run must take at most this fraction of a clear one
+STARTUP_BUDGET_RATIO = 0.5
+STARTUP_HEAVY_MODULES = ("numpy", "requests", "targets", "sky")
+
+# Runs main.run() in a fresh interpreter and reports which heavy modules got imported
+STARTUP_SCRIPT = """
+import json, sys
+if sys.argv[1] == "clear":
+    import notifier
+    notifier.deliver = lambda *args, **kwargs: {"bench": "sent"}
+import main
+main.run()
+print(json.dumps([m for m in sys.argv[2:] if m in sys.modules]))
+"""
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> np.ndarray:
+    """n objects spread uniformly over the sky with random type/difficulty."""
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(n, dtype=CATALOG_DTYPE)
+    rows["name"] = np.char.encode(np.char.add("SYN ", np.arange(n).astype(str)))
+    rows["ra"] = rng.uniform(0, 2 * np.pi, n)
+    rows["dec"] = np.arcsin(rng.uniform(-1, 1, n))
+    cos_dec = np.cos(rows["dec"])
+    rows["xyz"] = np.column_stack([cos_dec * np.cos(rows["ra"]), cos_dec * np.sin(rows["ra"]), np.sin(rows["dec"])])
+    rows["type"] = rng.integers(0, len(TYPE_NAMES), n)
+    rows["difficulty"] = rng.integers(0, len(DIFFICULTY_NAMES), n)
+    return rows
+
+
+def synthetic_forecast(params: dict, url: str = None, cloud_cover: int = 10,
+                       start: date = BENCH_NIGHT) -> dict:
+    """Open-Meteo shaped hourly forecast starting on `start` (the bench night)."""
+    hours = 24 * params.get("forecast_days", 2)
+    times = [f"{date.fromordinal(start.toordinal() + h // 24)}T{h % 24:02d}:00" for h in range(hours)]
+    return {
+        "latitude": params["latitude"],
+        "longitude": params["longitude"],
+        "hourly": {
+            "time": times,
+            "cloud_cover": [cloud_cover] * hours,
+            "relative_humidity_2m": [70] * hours,
+            "visibility": [24000.0] * hours,
+            "wind_speed_10m": [5.0] * hours,
+            "temperature_2m": [55.0] * hours,
+        },
+    }
+
+
+def measure(fn, repeat: int = 3) -> dict:
+    """Best wall time of `repeat` calls, plus peak memory and call count of one call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    profiler = cProfile.Profile()
+    profiler.runcall(fn)
+    calls = pstats.Stats(profiler).total_calls
+
+    return {"wall_s": round(min(timings), 6), "peak_kb": round(peak / 1024, 1), "calls": calls}
+
+
+def bench_context() -> NightContext:
+    return NightContext(*BENCH_SITE, night=BENCH_NIGHT)
+
+
+def run_suite(sizes=CATALOG_SIZES, steps=GRID_STEPS, repeat: int = 3) -> dict:
+    """Run every stage and return the results document."""
+    weather.fetch_forecast = synthetic_forecast
+    notifier.deliver = lambda *args, **kwargs: {"bench": "sent"}
+    results = []
+
+    def record(stage: str, params: dict, fn):
+        entry = {"stage": stage, "params": params, **measure(fn, repeat)}
+        results.append(entry)
+        print(f"  {stage:<22} {json.dumps(params):<34} {entry['wall_s'] * 1000:9.2f} ms "
+              f"{entry['peak_kb']:10.1f} KB {entry['calls']:9d} calls", file=sys.stderr)
+
+    ctx = bench_context()
+    moon = get_moon_info(ctx)
+    weather_now = weather.get_weather(ctx)
+
+    record("get_moon_info", {}, lambda: get_moon_info(bench_context()))
+    record("assess_conditions", {}, lambda: main.assess_conditions(weather_now, moon))
+    with contextlib.redirect_stdout(io.StringIO()):
+        record("main.run", {}, lambda: main.run(bench_context()))
+
+    obs = ctx.observer()
+    start, end = ctx.window
+    for n in sizes:
+        catalog = synthetic_catalog(n)
+        record("get_recommendations", {"catalog": n},
+               lambda: get_recommendations("snapshot", ctx=ctx, catalog=catalog))
+        for k in steps:
+            dates = np.linspace(float(start), float(end), k)
+            record("visibility_grid", {"catalog": n, "steps": k},
+                   lambda: visibility_grid(obs, catalog["ra"], catalog["dec"], dates, 15))
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "ephem": ephem.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def _startup_run(sky: str, cache_dir: str) -> tuple[float, list]:
+    """Wall time of a cold `main.run()` process and the heavy modules it imported."""
+    env = {**os.environ, "CLEARSKIES_CACHE": cache_dir}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, sky, *STARTUP_HEAVY_MODULES],
+                          env=env, capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def startup_budget(repeat: int = 5) -> list:
+    """Check that a cloudy night bails out cheaply.
+
+    Seeds a fresh forecast cache (so no network is touched) for tonight,
+    once cloudy and once clear, and times cold `main.run()` processes.
+
+    Returns:
+        List of budget violations (empty if within budget)
+    """
+    tonight = datetime.now(LOCAL_TZ).date()
+    params = weather.forecast_params(LATITUDE, LONGITUDE)
+    walls = {}
+    imported = {}
+    for sky, cloud_cover in (("cloudy", 95), ("clear", 5)):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, os.path.basename(weather._cache_path(params)))
+            with open(path, "w") as f:
+                json.dump({
+                    "fetched": time.time(),
+                    "model_run": weather.current_model_run(),
+                    "data": synthetic_forecast(params, cloud_cover=cloud_cover, start=tonight),
+                }, f)
+            runs = [_startup_run(sky, cache_dir) for _ in range(repeat)]
+        walls[sky] = min(wall for wall, _ in runs)
+        imported[sky] = runs[0][1]
+        print(f"  {sky:<7} {walls[sky] * 1000:8.1f} ms  heavy imports: {', '.join(imported[sky]) or 'none'}")
+
+    violations = []
+    if imported["cloudy"]:
+        violations.append(f"cloudy run imported {', '.join(imported['cloudy'])}")
+    if walls["cloudy"] > walls["clear"] * STARTUP_BUDGET_RATIO:
+        violations.append(f"cloudy run took {walls['cloudy'] / walls['clear']:.2f}x a clear run "
+                          f"(budget {STARTUP_BUDGET_RATIO}x)")
+    return violations
+
+
+def compare(old: dict, new: dict, threshold: float = 1.25) -> list:
+    """Stages whose wall time or peak memory grew by more than `threshold`x.
+
+    Returns:
+        List of (stage, params, metric, old_value, new_value) regressions
+    """
+    def key(entry):
+        return entry["stage"], json.dumps(entry["params"], sort_keys=True)
+
+    baseline = {key(e): e for e in old["results"]}
+    regressions = []
+    for entry in new["results"]:
+        before = baseline.get(key(entry))
+        if not before:
+            continue
+        for metric in ("wall_s", "peak_kb"):
+            if before[metric] > 0 and entry[metric] > before[metric] * threshold:
+                regressions.append((entry["stage"], entry["params"], metric, before[metric], entry[metric]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Clear Skies pipeline offline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = sub.add_parser("run", help="run the suite and write JSON results")
+    run_cmd.add_argument("--out", default="bench.json", help="results file (default bench.json)")
+    run_cmd.add_argument("--sizes", default=",".join(map(str, CATALOG_SIZES)), help="catalog sizes")
+    run_cmd.add_argument("--steps", default=",".join(map(str, GRID_STEPS)), help="time grid steps")
+    run_cmd.add_argument("--repeat", type=int, default=3, help="timed repeats per stage")
+
+    cmp_cmd = sub.add_parser("compare", help="flag regressions between two result files")
+    cmp_cmd.add_argument("old")
+    cmp_cmd.add_argument("new")
+    cmp_cmd.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown ratio")
+
+    startup_cmd = sub.add_parser("startup", help="check the cloudy-night bail-out against its time budget")
+    startup_cmd.add_argument("--repeat", type=int, default=5, help="cold runs per case")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sizes = [int(v) for v in args.sizes.split(",")]
+        steps = [int(v) for v in args.steps.split(",")]
+        doc = run_suite(sizes, steps, args.repeat)
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"Wrote {len(doc['results'])} results to {args.out}")
+    elif args.command == "startup":
+        violations = startup_budget(args.repeat)
+        for violation in violations:
+            print(f"OVER BUDGET: {violation}")
+        if not violations:
+            print("Within startup budget.")
+        sys.exit(1 if violations else 0)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        for stage, params, metric, before, after in regressions:
+            print(f"REGRESSION {stage} {json.dumps(params)} {metric}: {before} -> {after} ({after / before:.2f}x)")
+        if not regressions:
+            print("No regressions.")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,171 @@
+"""Compact binary target catalogs with a streaming CSV loader.
+
+A catalog is a NumPy structured array saved as a .npy file, so it can be
+memory-mapped: loading 100k objects reads a header and maps the rest, and
+every column is a typed array rather than a list of Python tuples.
+"""
+
+import argparse
+import csv
+import math
+import os
+import shutil
+import ephem
+import numpy as np
+
+TYPE_NAMES = np.array(["galaxy", "nebula", "cluster", "other"])
+DIFFICULTY_NAMES = np.array(["easy", "medium", "hard"])
+
+CATALOG_DTYPE = np.dtype([
+    ("name", "S32"),
+    ("ra", "f8"),  # J2000, radians
+    ("dec", "f8"),  # J2000, radians
+    ("xyz", "f8", (3,)),  # J2000 unit vector
+    ("type", "u1"),  # index into TYPE_NAMES
+    ("difficulty", "u1"),  # index into DIFFICULTY_NAMES
+])
+
+# OpenNGC object types -> our types (Dup/NonEx entries are skipped)
+OPENNGC_TYPES = {
+    "G": "galaxy", "GPair": "galaxy", "GTrpl": "galaxy", "GGroup": "galaxy",
+    "PN": "nebula", "HII": "nebula", "DrkN": "nebula", "EmN": "nebula", "Neb": "nebula",
+    "RfN": "nebula", "SNR": "nebula", "Cl+N": "nebula",
+    "OCl": "cluster", "GCl": "cluster", "*Ass": "cluster",
+}
+SKIP_TYPES = {"Dup", "NonEx"}
+
+# Column names for OpenNGC-style CSVs; pass another mapping for other catalogs
+OPENNGC_COLUMNS = {
+    "name": "Name", "type": "Type", "ra": "RA", "dec": "Dec",
+    "mag": "V-Mag", "alt_mag": "B-Mag", "size": "MajAx",
+}
+
+CHUNK_ROWS = 8192
+
+
+def _angle(text: str, hours: bool) -> float:
+    """Parse "hh:mm:ss"/"dd:mm:ss" (hours or degrees) or decimal degrees to radians."""
+    text = text.strip()
+    if ":" not in text:
+        return math.radians(float(text))
+    sign = -1.0 if text.startswith("-") else 1.0
+    parts = [abs(float(p)) for p in text.lstrip("+-").split(":")]
+    value = sum(p / 60**i for i, p in enumerate(parts))
+    return sign * math.radians(value * 15 if hours else value)
+
+
+def _number(text: str | None) -> float:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def estimate_difficulty(mag: float, size_arcmin: float) -> str:
+    """Rough imaging difficulty from magnitude and apparent size."""
+    if not math.isnan(mag):
+        if mag <= 7:
+            return "easy"
+        if mag <= 10 or size_arcmin >= 30:
+            return "medium"
+        return "hard"
+    return "medium" if size_arcmin >= 30 else "hard"
+
+
+def _fill_vectors(rows: np.ndarray):
+    cos_dec = np.cos(rows["dec"])
+    rows["xyz"][:, 0] = cos_dec * np.cos(rows["ra"])
+    rows["xyz"][:, 1] = cos_dec * np.sin(rows["ra"])
+    rows["xyz"][:, 2] = np.sin(rows["dec"])
+
+
+def from_entries(entries) -> np.ndarray:
+    """Build a catalog array from (name, ra, dec, type, difficulty) string tuples."""
+    rows = np.zeros(len(entries), dtype=CATALOG_DTYPE)
+    type_codes = {name: i for i, name in enumerate(TYPE_NAMES)}
+    difficulty_codes = {name: i for i, name in enumerate(DIFFICULTY_NAMES)}
+    for i, (name, ra, dec, obj_type, difficulty) in enumerate(entries):
+        rows[i]["name"] = name.encode("utf-8")[:32]
+        rows[i]["ra"] = float(ephem.hours(ra))
+        rows[i]["dec"] = float(ephem.degrees(dec))
+        rows[i]["type"] = type_codes.get(obj_type, type_codes["other"])
+        rows[i]["difficulty"] = difficulty_codes.get(difficulty, 2)
+    _fill_vectors(rows)
+    return rows
+
+
+def ingest_csv(csv_path: str, out_path: str, columns: dict = OPENNGC_COLUMNS,
+               delimiter: str = ";") -> int:
+    """Stream a CSV catalog into a .npy catalog file.
+
+    Rows are parsed one at a time into fixed-size chunk buffers that are
+    appended to disk, so memory use does not grow with the catalog.
+
+    Returns:
+        Number of objects written
+    """
+    type_codes = {name: i for i, name in enumerate(TYPE_NAMES)}
+    difficulty_codes = {name: i for i, name in enumerate(DIFFICULTY_NAMES)}
+    buffer = np.zeros(CHUNK_ROWS, dtype=CATALOG_DTYPE)
+    raw_path = f"{out_path}.raw"
+    count = 0
+    filled = 0
+
+    def flush(raw):
+        _fill_vectors(buffer[:filled])
+        buffer[:filled].tofile(raw)
+
+    with open(csv_path, newline="", encoding="utf-8") as src, open(raw_path, "wb") as raw:
+        for row in csv.DictReader(src, delimiter=delimiter):
+            obj_type = row.get(columns["type"], "")
+            if obj_type in SKIP_TYPES or not row.get(columns["ra"]) or not row.get(columns["dec"]):
+                continue
+
+            mag = _number(row.get(columns["mag"]))
+            if math.isnan(mag):
+                mag = _number(row.get(columns.get("alt_mag", "")))
+            size = _number(row.get(columns["size"]))
+            difficulty = estimate_difficulty(mag, 0.0 if math.isnan(size) else size)
+
+            rec = buffer[filled]
+            rec["name"] = row[columns["name"]].encode("utf-8")[:32]
+            rec["ra"] = _angle(row[columns["ra"]], hours=True)
+            rec["dec"] = _angle(row[columns["dec"]], hours=False)
+            rec["type"] = type_codes[OPENNGC_TYPES.get(obj_type, "other")]
+            rec["difficulty"] = difficulty_codes[difficulty]
+            filled += 1
+            count += 1
+            if filled == CHUNK_ROWS:
+                flush(raw)
+                filled = 0
+        flush(raw)
+
+    # Prepend the .npy header now that the row count is known
+    with open(out_path, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, {
+            "descr": np.lib.format.dtype_to_descr(CATALOG_DTYPE),
+            "fortran_order": False,
+            "shape": (count,),
+        })
+        shutil.copyfileobj(raw, out)
+    os.remove(raw_path)
+    return count
+
+
+def load_catalog(path: str) -> np.ndarray:
+    """Memory-map a catalog file written by ingest_csv."""
+    rows = np.load(path, mmap_mode="r")
+    if rows.dtype != CATALOG_DTYPE:
+        raise ValueError(f"{path} is not a catalog file")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a CSV catalog (OpenNGC format) to a binary catalog.")
+    parser.add_argument("csv", help="input CSV file")
+    parser.add_argument("out", help="output .npy catalog")
+    parser.add_argument("--delimiter", default=";", help="CSV delimiter (default ';')")
+    args = parser.parse_args()
+
+    n = ingest_csv(args.csv, args.out, delimiter=args.delimiter)
+    print(f"Wrote {n} objects to {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
@@ -11,8 +11,69 @@ LOCATION_NAME = "Zephyrhills, FL"
 
 # Notifications
 NTFY_TOPIC = "clearskies-chadp"
+NTFY_SERVER = os.environ.get("NTFY_SERVER", "https://ntfy.sh")
+# Topics to fan out to (comma-separated env var; default is the one topic above)
+NTFY_TOPICS = [t.strip() for t in os.environ.get("NTFY_TOPICS", NTFY_TOPIC).split(",") if t.strip()]
+NTFY_TIMEOUT = (3, 10)  # (connect, read) seconds; a slow ntfy response can't stall the run
+NOTIFY_WORKERS = 16  # Concurrent sends when fanning out to many topics
+OUTBOX_MAX_AGE_HOURS = 12  # Backstop: failed sends are retried until their night is over, never past this age
 
 # Scoring thresholds
 MIN_TARGET_SCORE = 6  # Only show targets scoring this or higher
 MIN_CONDITIONS_SCORE = 6  # Only notify if conditions score this or higher
 TOP_TARGETS_COUNT = 5  # Number of targets to show in notification
+# Optional JSON file overriding scoring thresholds/weights (see scoring.py)
+SCORING_FILE = os.environ.get("SCORING_FILE")
+
+# Visibility mode: "snapshot" scores each target at sunset+2h,
+# "night" scores it over a time grid covering the whole dark window
+VISIBILITY_MODE = os.environ.get("VISIBILITY_MODE", "snapshot")
+GRID_STEP_MINUTES = 5  # Time grid resolution for "night" mode
+MIN_ALTITUDE = 15  # Degrees above horizon for decent viewing
+MIN_IMAGING_HOURS = 2  # Hours above MIN_ALTITUDE for full altitude points
+# Optional local horizon profile ("azimuth altitude" lines, see horizon.py)
+HORIZON_FILE = os.environ.get("HORIZON_FILE")
+
+# Forecast API (override to point at a local stand-in, see fakes.py)
+OPENMETEO_URL = os.environ.get("OPENMETEO_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Ensemble forecast (ensemble.py): set a model (e.g. "gfs_seamless") to weigh every member's
+# forecast over the dark window; notify only if enough member-hours are usable
+ENSEMBLE_URL = os.environ.get("ENSEMBLE_URL", "https://ensemble-api.open-meteo.com/v1/ensemble")
+ENSEMBLE_MODEL = os.environ.get("CLEARSKIES_ENSEMBLE", "")
+MIN_CLEAR_PROBABILITY = float(os.environ.get("MIN_CLEAR_PROBABILITY", "0.5"))
+
+# Forecast cache (repeat runs within one model cycle skip the network)
+CACHE_DIR = os.environ.get("CLEARSKIES_CACHE", os.path.expanduser("~/.cache/clearskies"))
+FORECAST_TTL_MINUTES = 60  # Serve cached forecast without revalidating for this long
+MODEL_CYCLE_HOURS = 6  # Forecast model update cycle; a new cycle forces revalidation
+FORECAST_STALE_MAX_HOURS = 2 * MODEL_CYCLE_HOURS  # Oldest cached forecast served when Open-Meteo is down
+EPHEMERIS_DIR = os.path.join(CACHE_DIR, "ephemeris")  # Precomputed yearly tables (ephemtable.py)
+HTTP_TIMEOUT = (5, 20)  # (connect, read) seconds
+HTTP_RETRIES = 3  # Retries with exponential backoff on connection errors and 429/5xx
+FORECAST_BATCH = 50  # Coordinates per Open-Meteo request when fetching many sites
+
+# Multi-night planner
+PLANNER_DAYS = 10  # Nights to plan ahead (Open-Meteo allows up to 16 forecast days)
+
+# Dark-site search (darksite.py): candidate grid around home
+DARKSITE_RADIUS_KM = 100  # How far we're willing to drive
+DARKSITE_SPACING_KM = 25  # Grid spacing of candidate sites
+DARKSITE_CELL_DEG = 0.5  # Sites in the same cell share one sun/moon/target computation
+
+# Club/multi-member runs (subscribers.py): registry of members, grouping and parallelism
+SUBSCRIBERS_FILE = os.environ.get("CLEARSKIES_SUBSCRIBERS", "subscribers.json")
+SUBSCRIBER_GRID_DEG = 0.1  # Members within the same 0.1° cell share forecast and target work
+BATCH_WORKERS = int(os.environ.get("CLEARSKIES_WORKERS", "0")) or None  # Processes (default: all cores)
+
+# Target catalog: path to a binary catalog built with catalog.py (default: built-in list)
+CATALOG_PATH = os.environ.get("CATALOG_PATH")
+
+# Instrumentation (all optional): span/metric JSON lines, Prometheus textfile, cProfile dump
+TRACE_JSONL = os.environ.get("CLEARSKIES_TRACE")
+METRICS_TEXTFILE = os.environ.get("CLEARSKIES_METRICS")
+PROFILE_PATH = os.environ.get("CLEARSKIES_PROFILE")
+
+# Daemon mode (daemon.py): forecast poll interval and persisted state
+DAEMON_POLL_MINUTES = int(os.environ.get("CLEARSKIES_POLL_MINUTES", "30"))
+DAEMON_STATE_PATH = os.path.join(CACHE_DIR, "daemon-state.json")
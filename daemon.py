@@ -0,0 +1,144 @@
+"""Resident service mode: poll the forecast and notify when the decision changes.
+
+Work is keyed on what it depends on, so each poll redoes only what changed:
+
+- astronomy (moon info, target scores) once per night
+- conditions and the notification decision when the forecast changes
+- a notification only when the decision changes
+
+State is persisted after every poll, so a restart resumes without
+recomputing the night or re-sending a notification.
+
+    python daemon.py              # poll every DAEMON_POLL_MINUTES
+    python daemon.py --once       # single poll (e.g. from cron)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import threading
+import tracing
+from datetime import datetime
+from config import DAEMON_POLL_MINUTES, DAEMON_STATE_PATH, MIN_TARGET_SCORE, TRACE_JSONL, METRICS_TEXTFILE
+from main import decide, ensemble_check
+from moon import get_moon_info
+from night import LOCAL_TZ, get_night_context
+from notifier import deliver, flush_outbox
+from targets import get_recommendations
+from weather import get_weather
+
+
+def load_state(path: str = DAEMON_STATE_PATH) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict, path: str = DAEMON_STATE_PATH):
+    """Write state atomically so a crash never leaves a half-written file."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Daemon state write failed: {e}")
+
+
+def _fingerprint(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def decision_key(decision: dict) -> str:
+    """What a notification is about: go/no-go, priority and the targets.
+
+    The raw scores are left out, so forecast wobbles that move a score but
+    not the decision don't re-notify.
+    """
+    return _fingerprint([
+        decision["notify"],
+        decision.get("priority"),
+        decision.get("targets"),
+    ])
+
+
+def poll(state: dict) -> dict:
+    """One poll cycle; updates state in place and returns it."""
+    ctx = get_night_context()
+    night = f"{ctx.lat},{ctx.lon},{ctx.evening.isoformat()}"
+
+    # Astronomy: once per night
+    if state.get("night") != night:
+        with tracing.span("astronomy"):
+            state.clear()
+            targets = get_recommendations(ctx=ctx)
+            # Only targets that can make the notification are kept in the saved state
+            state.update(night=night, moon=get_moon_info(ctx),
+                         targets=targets[targets["score"] >= MIN_TARGET_SCORE].to_dicts())
+        print(f"New night {night}: {len(targets)} targets scored")
+
+    # Conditions and decision: when the forecast changes
+    weather = get_weather(ctx)
+    if not weather:
+        print("Failed to fetch weather; keeping previous decision")
+        return state
+    forecast = _fingerprint(weather)
+    if state.get("forecast") != forecast:
+        decision = decide(weather, state["moon"], state["targets"], ensemble=ensemble_check(ctx))
+        state.update(forecast=forecast, decision=decision, decision_key=decision_key(decision))
+        print(f"Forecast changed: conditions {decision['conditions_score']}/10")
+
+    # Notification: when the decision changes
+    decision = state["decision"]
+    if decision["notify"] and state.get("notified_key") != state["decision_key"]:
+        with tracing.span("notify", priority=decision["priority"]):
+            status = deliver(decision["title"], decision["message"], decision["priority"], night=ctx.evening)
+        state["notified_key"] = state["decision_key"]  # Failed topics are retried from the outbox
+        print(f"Notification {decision['title']}: {', '.join(sorted(set(status.values())))}")
+    else:
+        flush_outbox(ctx.evening)
+
+    state["polled"] = datetime.now(LOCAL_TZ).isoformat(timespec="seconds")
+    return state
+
+
+def serve(poll_minutes: int = DAEMON_POLL_MINUTES, state_path: str = DAEMON_STATE_PATH,
+          once: bool = False):
+    """Poll until SIGTERM/SIGINT, persisting state after every cycle."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    state = load_state(state_path)
+    if state.get("night"):
+        print(f"Resuming {state['night']} from {state_path}")
+
+    try:
+        while True:
+            tracing.reset()
+            try:
+                with tracing.span("poll"):
+                    poll(state)
+            except Exception as e:
+                print(f"Poll failed: {e}")
+            save_state(state, state_path)
+            tracing.export(TRACE_JSONL, METRICS_TEXTFILE)
+            if once or stop.wait(poll_minutes * 60):
+                return
+    except KeyboardInterrupt:
+        print("Interrupted; saving state")
+    finally:
+        # Also covers an interrupt mid-poll, so a restart resumes instead of re-deciding
+        save_state(state, state_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Clear Skies as a resident service.")
+    parser.add_argument("--poll", type=int, default=DAEMON_POLL_MINUTES, help="minutes between forecast polls")
+    parser.add_argument("--state", default=DAEMON_STATE_PATH, help="state file to persist and resume from")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    args = parser.parse_args()
+    serve(args.poll, args.state, args.once)
@@ -0,0 +1,140 @@
+"""Dark-site search: rank nearby sites for tonight when home is clouded out.
+
+Candidate sites (a grid within a radius of home, or a list from a file)
+are forecast with batched Open-Meteo requests, since the API takes lists of
+coordinates and answers with one forecast per site. Sun, moon and target
+work barely changes over a few tens of kilometres, so sites are grouped into
+DARKSITE_CELL_DEG cells and each cell is computed once, at its centre.
+
+    python darksite.py --radius 120 --spacing 20
+    python darksite.py --sites sites.txt     # "lat lon [name]" per line
+"""
+
+import argparse
+import math
+from config import (
+    DARKSITE_CELL_DEG, DARKSITE_RADIUS_KM, DARKSITE_SPACING_KM, LATITUDE, LONGITUDE,
+    MIN_TARGET_SCORE, VISIBILITY_MODE,
+)
+from main import assess_conditions
+from moon import get_moon_info
+from night import NightContext
+from planner import summarize_window
+from targets import get_top_targets
+from weather import fetch_forecasts, window_indices
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def grid_sites(lat: float = LATITUDE, lon: float = LONGITUDE, radius_km: float = DARKSITE_RADIUS_KM,
+               spacing_km: float = DARKSITE_SPACING_KM) -> list:
+    """Candidate sites on a square grid within radius_km of (lat, lon), home first."""
+    dlat = spacing_km / 111.2
+    dlon = dlat / max(0.01, math.cos(math.radians(lat)))
+    steps = int(radius_km // spacing_km)
+    sites = []
+    for i in range(-steps, steps + 1):
+        for j in range(-steps, steps + 1):
+            site = (round(lat + i * dlat, 4), round(lon + j * dlon, 4))
+            if distance_km(lat, lon, *site) <= radius_km:
+                sites.append({"lat": site[0], "lon": site[1], "name": None})
+    sites.sort(key=lambda s: distance_km(lat, lon, s["lat"], s["lon"]))
+    return sites
+
+
+def load_sites(path: str) -> list:
+    """Sites from a file of "lat lon [name]" lines (# comments allowed)."""
+    sites = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split("#", 1)[0].replace(",", " ").split(maxsplit=2)
+            if fields:
+                sites.append({"lat": float(fields[0]), "lon": float(fields[1]),
+                              "name": fields[2].strip() if len(fields) > 2 else None})
+    return sites
+
+
+def cell_of(lat: float, lon: float, size: float = DARKSITE_CELL_DEG) -> tuple[float, float]:
+    """Centre of the cell a site falls in."""
+    return ((math.floor(lat / size) + 0.5) * size, (math.floor(lon / size) + 0.5) * size)
+
+
+def evaluate_cell(lat: float, lon: float, mode: str = VISIBILITY_MODE, top: int = 3) -> dict:
+    """Astronomy shared by every site in a cell: night context, moon and top targets."""
+    ctx = NightContext(lat, lon)
+    moon = get_moon_info(ctx)
+    targets = list(get_top_targets(top, mode, ctx=ctx, min_score=MIN_TARGET_SCORE))
+    return {"ctx": ctx, "moon": moon, "targets": targets}
+
+
+def search(sites: list, home: tuple[float, float] = (LATITUDE, LONGITUDE),
+           mode: str = VISIBILITY_MODE, top: int = 3) -> list:
+    """Score tonight's dark window at every site.
+
+    Returns:
+        List of site dicts (lat, lon, name, distance_km, conditions_score,
+        summary, weather, moon, targets), best first: conditions score, then
+        best target score, then clear hours, then nearest
+    """
+    forecasts = fetch_forecasts([(s["lat"], s["lon"]) for s in sites])
+    cells = {}
+    for site in sites:
+        cells.setdefault(cell_of(site["lat"], site["lon"]), None)
+    for key in cells:
+        cells[key] = evaluate_cell(*key, mode=mode, top=top)
+
+    results = []
+    for site, data in zip(sites, forecasts):
+        if not data:
+            continue
+        cell = cells[cell_of(site["lat"], site["lon"])]
+        hourly = data["hourly"]
+        indices = window_indices(hourly["time"], *cell["ctx"].window)
+        if not indices:
+            continue
+        weather = summarize_window(hourly, indices)
+        score, summary = assess_conditions(weather, cell["moon"])
+        results.append({
+            **site,
+            "distance_km": round(distance_km(*home, site["lat"], site["lon"]), 1),
+            "conditions_score": score,
+            "summary": summary,
+            "weather": weather,
+            "moon": cell["moon"],
+            "targets": cell["targets"],
+        })
+
+    results.sort(key=lambda r: (-r["conditions_score"],
+                                -(r["targets"][0]["score"] if r["targets"] else 0),
+                                -r["weather"]["clear_hours"],
+                                r["distance_km"]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank nearby observing sites for tonight.")
+    parser.add_argument("--radius", type=float, default=DARKSITE_RADIUS_KM, help="search radius (km)")
+    parser.add_argument("--spacing", type=float, default=DARKSITE_SPACING_KM, help="grid spacing (km)")
+    parser.add_argument("--sites", help='file of candidate sites ("lat lon [name]" per line) instead of a grid')
+    parser.add_argument("--top", type=int, default=5, help="sites to list")
+    args = parser.parse_args()
+
+    sites = load_sites(args.sites) if args.sites else grid_sites(radius_km=args.radius, spacing_km=args.spacing)
+    results = search(sites)
+    print(f"=== Best sites tonight ({len(results)} of {len(sites)} evaluated) ===\n")
+    for i, r in enumerate(results[:args.top], 1):
+        label = r["name"] or f"{r['lat']:.3f}, {r['lon']:.3f}"
+        print(f"{i}. {label} ({r['distance_km']:.0f} km) [{r['conditions_score']}/10] {r['summary']}")
+        print(f"   clear hours: {r['weather']['clear_hours']} | cloud {r['weather']['cloud_cover']}% | "
+              f"wind {r['weather']['wind_mph']:.0f} mph")
+        for t in r["targets"]:
+            print(f"   - {t['name']} [{t['score']}/10]")
+        print()
@@ -0,0 +1,138 @@
+"""Ensemble forecasts: probability of usable skies instead of one model run.
+
+Open-Meteo's ensemble API returns every member of a model's ensemble (e.g.
+the 31 GFS members) as separate hourly series: "cloud_cover" for the control
+run and "cloud_cover_member01", ... for the rest. These are stacked into
+members x hours arrays, and the conditions score (scoring.py) is evaluated for
+every member and every hour of the dark window in one step. The moon's
+altitude and phase are computed per hour from the night's interpolated
+ephemeris, so a moon rising mid-window counts only from then on.
+
+The result is the share of member-hours whose score clears the threshold
+(the probability of usable skies), and a confidence band: the 10th-90th
+percentile, across members, of each member's usable share.
+
+    python ensemble.py                                      # tonight, live API
+    python ensemble.py --fixture fixtures/ensemble_sample.json
+"""
+
+import re
+from datetime import datetime
+import ephem
+import numpy as np
+import pytz
+from config import ENSEMBLE_MODEL, ENSEMBLE_URL, MIN_CONDITIONS_SCORE
+from night import LOCAL_TZ, NightContext, get_night_context
+from results import round_exact
+from scoring import conditions_score_array
+from weather import fetch_forecast, forecast_params, window_indices
+
+ENSEMBLE_VARIABLES = "cloud_cover,relative_humidity_2m,wind_speed_10m"
+BAND = (10, 90)  # Percentiles of per-member usable share reported as the confidence band
+
+
+def member_array(hourly: dict, variable: str) -> np.ndarray:
+    """Stack a variable's control and member series into a members x hours array.
+
+    Missing values (null) become NaN.
+    """
+    pattern = re.compile(rf"{re.escape(variable)}(_member\d+)?$")
+    keys = sorted(k for k in hourly if pattern.match(k))
+    if not keys:
+        raise KeyError(f"no {variable} series in ensemble response")
+    return np.array([[np.nan if v is None else v for v in hourly[k]] for k in keys], dtype=float)
+
+
+def fetch_ensemble(ctx: NightContext, model: str = ENSEMBLE_MODEL, days: int = 2) -> dict:
+    """Hourly ensemble response for the context's site (cached like single forecasts)."""
+    params = {**forecast_params(ctx.lat, ctx.lon, days), "hourly": ENSEMBLE_VARIABLES, "models": model}
+    return fetch_forecast(params, url=ENSEMBLE_URL)
+
+
+def hour_dates(times: list, indices: list, ctx: NightContext) -> np.ndarray:
+    """Ephem date of each window hour's start, clamped to the start of the window."""
+    start = float(ctx.window[0])
+    dates = [ephem.Date(LOCAL_TZ.localize(datetime.fromisoformat(times[i])).astimezone(pytz.UTC)) for i in indices]
+    return np.maximum(start, np.array(dates, dtype=float))
+
+
+def clear_probability(hourly: dict, ctx: NightContext,
+                      min_conditions_score: int = MIN_CONDITIONS_SCORE, rules: dict | None = None) -> dict | None:
+    """Probability of usable skies over the dark window.
+
+    Args:
+        hourly: "hourly" block of an ensemble response (local time strings)
+        ctx: night context; its window selects the hours
+        min_conditions_score: score a member-hour needs to count as usable
+
+    Returns:
+        dict with probability, low and high (the confidence band), members,
+        hours and usable_hours (expected usable hours), or None if the
+        response doesn't cover the window
+    """
+    indices = window_indices(hourly["time"], *ctx.window)
+    if not indices:
+        return None
+    values = {
+        "cloud_cover": member_array(hourly, "cloud_cover")[:, indices],
+        "humidity": member_array(hourly, "relative_humidity_2m")[:, indices],
+        "wind_mph": member_array(hourly, "wind_speed_10m")[:, indices],
+    }
+
+    # Moon per hour, since it may rise or set during the window
+    hours = hour_dates(hourly["time"], indices, ctx)
+    moon = ctx.bodies.positions(hours, ["Moon"])["Moon"]
+    values["moon_phase"] = round_exact(ctx.bodies.moon_phase(hours))
+
+    scores = conditions_score_array(values, moon["altitude"] > 0, rules=rules)
+    usable = (scores >= min_conditions_score) & ~np.isnan(values["cloud_cover"] + values["humidity"]
+                                                         + values["wind_mph"])
+    per_member = usable.mean(axis=1)
+    low, high = np.percentile(per_member, BAND)
+    return {
+        "probability": round(float(usable.mean()), 2),
+        "low": round(float(low), 2),
+        "high": round(float(high), 2),
+        "members": usable.shape[0],
+        "hours": usable.shape[1],
+        "usable_hours": round(float(usable.sum(axis=1).mean()), 1),
+    }
+
+
+def get_clear_probability(ctx: NightContext | None = None,
+                          min_conditions_score: int = MIN_CONDITIONS_SCORE) -> dict | None:
+    """Fetch tonight's ensemble and evaluate it (None if the request fails)."""
+    ctx = ctx or get_night_context()
+    try:
+        return clear_probability(fetch_ensemble(ctx)["hourly"], ctx, min_conditions_score)
+    except Exception as e:
+        print(f"Ensemble fetch failed: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from datetime import date
+
+    parser = argparse.ArgumentParser(description="Probability of usable skies from an ensemble forecast.")
+    parser.add_argument("--fixture", help="recorded ensemble response (JSON) to evaluate offline")
+    parser.add_argument("--min-score", type=int, default=MIN_CONDITIONS_SCORE, help="usable conditions score")
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture) as f:
+            data = json.load(f)
+        # Evaluate the night that starts on the recording's first day
+        ctx = NightContext(data["latitude"], data["longitude"], date.fromisoformat(data["hourly"]["time"][0][:10]))
+        result = clear_probability(data["hourly"], ctx, args.min_score)
+    else:
+        ctx = get_night_context()
+        result = get_clear_probability(ctx, args.min_score)
+
+    if result is None:
+        print("No ensemble forecast for the dark window")
+    else:
+        print(f"Night of {ctx.evening}, {result['hours']} window hours x {result['members']} members")
+        print(f"Usable skies (score {args.min_score}+): {result['probability']:.0%} "
+              f"(band {result['low']:.0%}-{result['high']:.0%}, {result['usable_hours']} usable hours expected)")
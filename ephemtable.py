@@ -0,0 +1,225 @@
+"""Precomputed per-site ephemeris tables for a year of nights.
+
+Catalog objects are fixed on the sky, so everything the nightly run solves
+for them can be computed ahead of time. `build_table` evaluates each night
+once. It stores the sun events and dark window, plus each target's
+snapshot position (altitude, azimuth, moon separation, visibility),
+rise/transit/set and whole-window peak (the visibility_grid output). The
+tables are saved as .npy files. A nightly run memory-maps them and
+indexes one row.
+
+    python ephemtable.py build --days 365
+    python ephemtable.py check        # a 4pm (cron) run finds its night in the table
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+import ephem
+import numpy as np
+from catalog import DIFFICULTY_NAMES, TYPE_NAMES
+from night import NightContext
+from sky import compute_catalog, time_grid, visibility_grid
+
+ROW_TOLERANCE_S = 1.0  # Viewing-time drift (seconds) still accepted as the same night
+TABLE_FORMAT = 2  # Bumped when stored values change (2: night grid ends at dawn); older tables are ignored
+
+NIGHT_DTYPE = np.dtype([
+    ("evening", "i8"),  # date.toordinal() of the evening
+    ("sunset", "f8"),
+    ("sunrise", "f8"),
+    ("viewing_time", "f8"),
+    ("dawn", "f8"),
+])
+
+# Snapshot fields mirror compute_catalog, night fields mirror visibility_grid
+TARGET_DTYPE = np.dtype([
+    ("altitude", "f8"),
+    ("azimuth", "f8"),
+    ("moon_separation", "f8"),
+    ("visible", "?"),
+    ("masked", "?"),
+    ("transit", "f8"),
+    ("rise", "f8"),
+    ("set", "f8"),
+    ("circumpolar", "?"),
+    ("never_up", "?"),
+    ("steps_up", "i4"),
+    ("steps_blocked", "i4"),
+    ("best_altitude", "f8"),
+    ("best_azimuth", "f8"),
+    ("best_time", "f8"),
+    ("night_moon_separation", "f8"),
+])
+SNAPSHOT_FIELDS = ("altitude", "azimuth", "moon_separation", "visible", "masked",
+                   "transit", "rise", "set", "circumpolar", "never_up")
+GRID_FIELDS = ("steps_up", "steps_blocked", "best_altitude", "best_azimuth", "best_time")
+
+
+def fingerprint(*arrays) -> str:
+    """Short hash of arrays (catalog rows, horizon) to detect stale tables."""
+    digest = hashlib.sha1()
+    for a in arrays:
+        if a is not None:
+            digest.update(np.ascontiguousarray(a).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def table_dir(root: str, lat: float, lon: float) -> str:
+    return os.path.join(root, f"site_{lat:.4f}_{lon:.4f}")
+
+
+def build_table(path: str, lat: float, lon: float, start: date, days: int, catalog: np.ndarray,
+                min_alt: float, step_minutes: int, horizon: np.ndarray | None = None,
+                source: str = "") -> int:
+    """Evaluate `days` nights from `start` and write the table to directory `path`.
+
+    Args:
+        catalog: rows to tabulate (already culled for the site)
+        min_alt, step_minutes, horizon: the visibility settings the table is valid for
+        source: fingerprint of the full catalog the rows were culled from
+
+    Returns:
+        Number of nights written
+    """
+    os.makedirs(path, exist_ok=True)
+    nights = np.zeros(days, dtype=NIGHT_DTYPE)
+    rows = np.lib.format.open_memmap(os.path.join(path, "targets.npy.tmp"), mode="w+",
+                                     dtype=TARGET_DTYPE, shape=(days, len(catalog)))
+    for i in range(days):
+        ctx = NightContext(lat, lon, start + timedelta(days=i))
+        nights[i] = (ctx.evening.toordinal(), ctx.sunset, ctx.sunrise, ctx.viewing_time, ctx.dawn)
+
+        snapshot = compute_catalog(ctx.observer(), catalog, ctx.moon, min_alt=min_alt, horizon=horizon)
+        for field in SNAPSHOT_FIELDS:
+            rows[i][field] = snapshot[field]
+
+        dates = time_grid(*ctx.window, step_minutes)
+        grid = visibility_grid(ctx.observer(), catalog["ra"], catalog["dec"], dates, min_alt, horizon=horizon)
+        for field in GRID_FIELDS:
+            rows[i][field] = grid[field]
+        rows[i]["night_moon_separation"] = grid["moon_separation"]
+    rows.flush()
+    del rows
+
+    np.save(os.path.join(path, "nights.npy"), nights)
+    np.save(os.path.join(path, "catalog.npy"), catalog)
+    os.replace(os.path.join(path, "targets.npy.tmp"), os.path.join(path, "targets.npy"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "lat": lat, "lon": lon, "start": start.isoformat(), "days": days,
+            "min_alt": min_alt, "step_minutes": step_minutes,
+            "horizon": fingerprint(horizon), "source": source, "format": TABLE_FORMAT,
+        }, f, indent=2)
+    return days
+
+
+class EphemerisTable:
+    """Memory-mapped table written by build_table; rows are looked up by evening."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.nights = np.load(os.path.join(path, "nights.npy"), mmap_mode="r")
+        self.targets = np.load(os.path.join(path, "targets.npy"), mmap_mode="r")
+        self.catalog = np.load(os.path.join(path, "catalog.npy"), mmap_mode="r")
+        self.first = int(self.nights["evening"][0]) if len(self.nights) else 0
+
+    def matches(self, min_alt: float, step_minutes: int, horizon: np.ndarray | None, source: str) -> bool:
+        """Whether the table was built with these settings and catalog, by this version."""
+        m = self.meta
+        return (m.get("format") == TABLE_FORMAT and m["min_alt"] == min_alt and m["step_minutes"] == step_minutes
+                and m["horizon"] == fingerprint(horizon) and m["source"] == source)
+
+    def row(self, ctx: NightContext) -> int | None:
+        """Table row for ctx's night, or None if not covered.
+
+        Tables are built from noon-anchored contexts, while a live run anchors
+        at the current time, so ephem's sunset (and the viewing time) can
+        differ by milliseconds; anything within ROW_TOLERANCE_S is the same night.
+        """
+        i = ctx.evening.toordinal() - self.first
+        if not 0 <= i < len(self.nights):
+            return None
+        drift = abs(self.nights["viewing_time"][i] - float(ctx.viewing_time)) * 86400
+        return i if drift <= ROW_TOLERANCE_S else None
+
+    def snapshot(self, i: int) -> dict:
+        """Row i in the shape compute_catalog returns."""
+        rows = self.targets[i]
+        return {
+            "name": np.char.decode(self.catalog["name"], "utf-8"),
+            "type": TYPE_NAMES[self.catalog["type"]],
+            "difficulty": DIFFICULTY_NAMES[self.catalog["difficulty"]],
+            **{field: rows[field] for field in SNAPSHOT_FIELDS},
+        }
+
+    def grid(self, i: int) -> dict:
+        """Row i in the shape visibility_grid returns."""
+        rows = self.targets[i]
+        return {**{field: rows[field] for field in GRID_FIELDS}, "moon_separation": rows["night_moon_separation"]}
+
+
+def open_table(root: str, lat: float, lon: float) -> EphemerisTable | None:
+    """Table for a site, or None if none has been built."""
+    try:
+        return EphemerisTable(table_dir(root, lat, lon))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+if __name__ == "__main__":
+    import time
+    from config import EPHEMERIS_DIR, GRID_STEP_MINUTES, LATITUDE, LONGITUDE, MIN_ALTITUDE
+    from night import LOCAL_TZ
+    from datetime import datetime
+    from targets import catalog_fingerprint, get_candidates, get_horizon
+
+    parser = argparse.ArgumentParser(description="Precompute a year of nightly ephemeris for the site.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="build (or rebuild) the site's table")
+    build_cmd.add_argument("--start", type=date.fromisoformat, help="first evening (default: today)")
+    build_cmd.add_argument("--days", type=int, default=365, help="number of nights")
+    check_cmd = sub.add_parser("check", help="build a few nights in a temp dir and check live runs find them")
+    check_cmd.add_argument("--days", type=int, default=7, help="number of nights")
+    check_cmd.add_argument("--hour", type=int, default=16, help="local hour of the simulated live run")
+    args = parser.parse_args()
+
+    horizon = get_horizon()
+    catalog = get_candidates(LATITUDE, min_alt=MIN_ALTITUDE if horizon is None else horizon.min())
+
+    if args.command == "check":
+        import sys
+        import tempfile
+        from datetime import time as clock
+        import pytz
+
+        start = datetime.now(LOCAL_TZ).date()
+        with tempfile.TemporaryDirectory() as root:
+            path = table_dir(root, LATITUDE, LONGITUDE)
+            build_table(path, LATITUDE, LONGITUDE, start, args.days, np.ascontiguousarray(catalog),
+                        MIN_ALTITUDE, GRID_STEP_MINUTES, horizon, catalog_fingerprint())
+            table = open_table(root, LATITUDE, LONGITUDE)
+            missed = []
+            for offset in range(args.days):
+                night = start + timedelta(days=offset)
+                # Anchor like get_night_context() does for a run at that hour: max(noon, now)
+                ctx = NightContext(LATITUDE, LONGITUDE, night)
+                run_at = LOCAL_TZ.localize(datetime.combine(night, clock(args.hour)))
+                ctx.anchor = ephem.Date(max(float(ctx.anchor), float(ephem.Date(run_at.astimezone(pytz.UTC)))))
+                if table.row(ctx) != offset:
+                    missed.append(night)
+        print(f"{args.days - len(missed)}/{args.days} nights found for a {args.hour}:00 run")
+        if missed:
+            print("Missed: " + ", ".join(str(night) for night in missed))
+            sys.exit(1)
+        sys.exit(0)
+
+    start = args.start or datetime.now(LOCAL_TZ).date()
+    path = table_dir(EPHEMERIS_DIR, LATITUDE, LONGITUDE)
+    began = time.perf_counter()
+    n = build_table(path, LATITUDE, LONGITUDE, start, args.days, np.ascontiguousarray(catalog),
+                    MIN_ALTITUDE, GRID_STEP_MINUTES, horizon, catalog_fingerprint())
+    print(f"Wrote {n} nights x {len(catalog)} targets to {path} in {time.perf_counter() - began:.1f}s")
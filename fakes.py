@@ -0,0 +1,228 @@
+"""Local stand-ins for Open-Meteo and ntfy, for offline and load testing.
+
+One HTTP server answers both APIs:
+
+- GET /v1/forecast: an Open-Meteo shaped hourly forecast, either synthetic
+  (deterministic per site and day) or a recorded response from a JSON file;
+  comma-separated coordinates get a list of forecasts
+- GET /v1/ensemble: the same with ensemble members ("cloud_cover_member01",
+  ...) spread around the synthetic forecast, or a recorded ensemble response
+- POST /<topic>: accepts an ntfy publish and counts it
+
+Latency and error rate are configurable, so retry/backoff and failure
+handling can be exercised. Point the pipeline at it with
+
+    python fakes.py --port 8080 --latency 50 --error-rate 0.05
+    OPENMETEO_URL=http://127.0.0.1:8080/v1/forecast ENSEMBLE_URL=http://127.0.0.1:8080/v1/ensemble NTFY_SERVER=http://127.0.0.1:8080 python main.py
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pytz
+
+FORECAST_PATH = "/v1/forecast"
+ENSEMBLE_PATH = "/v1/ensemble"
+ENSEMBLE_MEMBERS = 30  # Members besides the control run, like GFS
+
+
+def synthetic_forecast(lat: float, lon: float, days: int = 2, tz: str = "UTC",
+                       hourly: str = "", cloud_cover: int | None = None) -> dict:
+    """Open-Meteo shaped forecast starting today (local), varying by site and day."""
+    start = datetime.now(pytz.timezone(tz)).replace(hour=0, minute=0, second=0, microsecond=0)
+    times, clouds, humidity, wind = [], [], [], []
+    for h in range(24 * days):
+        slot = start + timedelta(hours=h)
+        day_seed = f"{lat:.2f},{lon:.2f},{slot:%Y-%m-%d}"
+        rng = random.Random(hashlib.sha1(day_seed.encode()).digest())
+        base = rng.choice((5, 20, 45, 70, 95)) if cloud_cover is None else cloud_cover
+        times.append(f"{slot:%Y-%m-%dT%H:00}")
+        clouds.append(max(0, min(100, base + (h % 5) - 2)))
+        humidity.append(60 + rng.randint(0, 35))
+        wind.append(round(rng.uniform(0, 18), 1))
+    series = {
+        "time": times,
+        "cloud_cover": clouds,
+        "relative_humidity_2m": humidity,
+        "visibility": [24140.0] * len(times),
+        "wind_speed_10m": wind,
+        "temperature_2m": [70.0] * len(times),
+    }
+    wanted = [v for v in hourly.split(",") if v] or list(series)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": tz,
+        "hourly": {k: v for k, v in series.items() if k == "time" or k in wanted},
+    }
+
+
+def synthetic_ensemble(lat: float, lon: float, days: int = 2, tz: str = "UTC", hourly: str = "",
+                       cloud_cover: int | None = None, members: int = ENSEMBLE_MEMBERS) -> dict:
+    """Synthetic forecast as the control run plus members with per-member cloud and wind noise."""
+    forecast = synthetic_forecast(lat, lon, days, tz, hourly, cloud_cover)
+    series = forecast["hourly"]
+    for m in range(1, members + 1):
+        rng = random.Random(f"{lat:.2f},{lon:.2f},{m}")
+        for name in [k for k in list(series) if k != "time" and "_member" not in k]:
+            spread = {"cloud_cover": 25, "wind_speed_10m": 3}.get(name, 0)
+            series[f"{name}_member{m:02d}"] = [
+                max(0, min(100, round(v + rng.uniform(-spread, spread)))) if name == "cloud_cover"
+                else max(0, round(v + rng.uniform(-spread, spread), 1)) for v in series[name]]
+    return forecast
+
+
+class FakeState:
+    """Behaviour knobs and request counters shared by the handler threads."""
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, recorded: dict | None = None,
+                 cloud_cover: int | None = None, seed: int = 0, recorded_ensemble: dict | None = None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.recorded = recorded
+        self.recorded_ensemble = recorded_ensemble
+        self.cloud_cover = cloud_cover
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"forecast": 0, "not_modified": 0, "publish": 0, "errors": 0}
+        self.published = []
+
+    def bump(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    state: FakeState = None  # set per server in start()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: dict | None = None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_fail(self) -> bool:
+        """Apply latency; returns True if this request got an injected error."""
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms / 1000)
+        if self.state.should_fail():
+            self.state.bump("errors")
+            self._reply(503, b"injected failure")
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path not in (FORECAST_PATH, ENSEMBLE_PATH):
+            return self._reply(404)
+        if self._delay_or_fail():
+            return
+
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        # Like Open-Meteo, a list of coordinates gets a list of forecasts back
+        lats = [float(v) for v in q.get("latitude", "0").split(",")]
+        lons = [float(v) for v in q.get("longitude", "0").split(",")]
+        ensemble = url.path == ENSEMBLE_PATH
+        recorded = self.state.recorded_ensemble if ensemble else self.state.recorded
+        synthetic = synthetic_ensemble if ensemble else synthetic_forecast
+        forecasts = []
+        for lat, lon in zip(lats, lons):
+            if recorded:
+                forecasts.append({**recorded, "latitude": lat, "longitude": lon})
+            else:
+                forecasts.append(synthetic(lat, lon, int(q.get("forecast_days", 2)),
+                                           q.get("timezone", "UTC"), q.get("hourly", ""),
+                                           self.state.cloud_cover))
+        body = json.dumps(forecasts if len(forecasts) > 1 else forecasts[0]).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.state.bump("not_modified")
+            return self._reply(304, headers={"ETag": etag})
+        self.state.bump("forecast")
+        self._reply(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._delay_or_fail():
+            return
+        self.state.bump("publish")
+        with self.state.lock:
+            self.state.published.append({
+                "topic": urlsplit(self.path).path.lstrip("/"),
+                "title": self.headers.get("Title"),
+                "priority": self.headers.get("Priority"),
+                "bytes": len(body),
+            })
+        self._reply(200, b'{"event":"message"}', {"Content-Type": "application/json"})
+
+
+def start(host: str = "127.0.0.1", port: int = 0, **knobs) -> tuple[ThreadingHTTPServer, FakeState]:
+    """Start the fake server on a background thread (port 0 picks a free port)."""
+    state = FakeState(**knobs)
+    handler = type("BoundFakeHandler", (FakeHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+@contextlib.contextmanager
+def running(**knobs):
+    """Run the fake server for the duration of a with-block; yields (base_url, state)."""
+    server, state = start(**knobs)
+    try:
+        yield base_url(server), state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Open-Meteo and ntfy APIs locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0, help="added latency per request (ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered 503")
+    parser.add_argument("--forecast", help="recorded Open-Meteo response (JSON) to serve instead of synthetic data")
+    parser.add_argument("--ensemble", help="recorded Open-Meteo ensemble response (JSON) to serve")
+    parser.add_argument("--cloud-cover", type=int, help="fixed cloud cover %% for synthetic forecasts")
+    args = parser.parse_args()
+
+    recorded = recorded_ensemble = None
+    if args.forecast:
+        with open(args.forecast) as f:
+            recorded = json.load(f)
+    if args.ensemble:
+        with open(args.ensemble) as f:
+            recorded_ensemble = json.load(f)
+    server, state = start(args.host, args.port, latency_ms=args.latency, error_rate=args.error_rate,
+                          recorded=recorded, cloud_cover=args.cloud_cover, recorded_ensemble=recorded_ensemble)
+    url = base_url(server)
+    print(f"OPENMETEO_URL={url}{FORECAST_PATH} ENSEMBLE_URL={url}{ENSEMBLE_PATH} NTFY_SERVER={url}")
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(state.counts))
+    except KeyboardInterrupt:
+        server.shutdown()
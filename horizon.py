@@ -0,0 +1,75 @@
+"""Local horizon profile (trees, houses) as an azimuth lookup table.
+
+A horizon file lists "azimuth altitude" pairs in degrees, one per line
+(the format Stellarium uses for horizon polygons); blank lines and lines
+starting with # are ignored, and commas work as separators too:
+
+    # az  alt
+    0     12
+    80    35   # trees to the east
+    110   35
+    170   28   # house to the south
+    200   10
+
+Points are joined by straight lines around the full circle and sampled into
+a fixed array of bins, so checking any number of (altitude, azimuth) pairs
+is one array lookup.
+"""
+
+import numpy as np
+
+HORIZON_BINS = 360
+
+
+def parse_profile(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Azimuth and altitude arrays (degrees, sorted by azimuth) from a horizon file."""
+    points = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].replace(",", " ").split()
+            if line:
+                points.append((float(line[0]) % 360, float(line[1])))
+    if not points:
+        raise ValueError(f"{path} has no horizon points")
+    az, alt = np.array(sorted(points)).T
+    return az, alt
+
+
+def build_mask(az: np.ndarray, alt: np.ndarray, bins: int = HORIZON_BINS) -> np.ndarray:
+    """Horizon altitude per azimuth bin.
+
+    The profile is linear between points, so its highest value inside a bin
+    is at one of the bin's edges or at a profile point within it. Each bin
+    keeps that maximum, so a target is never reported clear while partly
+    behind an obstruction.
+    """
+    edges = np.interp(np.arange(bins + 1) * 360 / bins, az, alt, period=360)
+    mask = np.maximum(edges[:-1], edges[1:])
+    np.maximum.at(mask, (az * bins / 360).astype(np.intp) % bins, alt)
+    return mask
+
+
+def load_horizon(path: str, min_alt: float = 0.0, bins: int = HORIZON_BINS) -> np.ndarray:
+    """Altitude limit per azimuth bin: the horizon profile, but never below min_alt."""
+    return np.maximum(build_mask(*parse_profile(path), bins=bins), min_alt)
+
+
+def limit_at(limits: np.ndarray, az) -> np.ndarray:
+    """Altitude limit (degrees) at azimuths given in radians (any array shape)."""
+    bins = len(limits)
+    idx = (np.asarray(az) * (bins / (2 * np.pi))).astype(np.intp) % bins
+    return limits[idx]
+
+
+def clear_of(limits: np.ndarray, alt_deg, az) -> np.ndarray:
+    """True where altitude (degrees) is above the limit at that azimuth (radians)."""
+    return np.asarray(alt_deg) > limit_at(limits, az)
+
+
+if __name__ == "__main__":
+    import sys
+
+    limits = load_horizon(sys.argv[1])
+    for az in range(0, 360, 15):
+        limit = limit_at(limits, np.radians(az))
+        print(f"{az:3d}°  {limit:5.1f}°  {'#' * max(0, int(limit))}")
@@ -0,0 +1,132 @@
+"""Load-test the pipeline against the local fake Open-Meteo/ntfy server.
+
+Runs main.run for a batch of sites concurrently, fully offline, and reports
+throughput, per-run latency percentiles and how failures were handled.
+
+    python loadtest.py --sites 200 --concurrency 8 --latency 50 --error-rate 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fakes import FORECAST_PATH, running
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def load_sites(center: tuple[float, float], n: int, spread: float = 5.0, seed: int = 0) -> list:
+    """n sites scattered within +/- spread degrees of center (lat, lon)."""
+    rng = random.Random(seed)
+    lat, lon = center
+    return [(round(lat + rng.uniform(-spread, spread), 4), round(lon + rng.uniform(-spread, spread), 4))
+            for _ in range(n)]
+
+
+def outcome(decision: dict | None) -> str:
+    """Classify one main.run result."""
+    if decision is None:
+        return "no_forecast"
+    if not decision["notify"]:
+        return "no_go"
+    delivery = set(decision["delivery"].values())
+    if "queued" in delivery:
+        return "queued"
+    return "duplicate" if delivery == {"duplicate"} else "sent"
+
+
+def drive(base_url: str, n_sites: int, concurrency: int) -> dict:
+    """Run main.run for n_sites sites against base_url and collect latencies and outcomes.
+
+    Must run before anything imports config, which reads the endpoints once.
+    """
+    # Point the pipeline at the fakes, with an empty forecast cache and outbox
+    os.environ["OPENMETEO_URL"] = base_url + FORECAST_PATH
+    os.environ["NTFY_SERVER"] = base_url
+    os.environ["CLEARSKIES_CACHE"] = tempfile.mkdtemp(prefix="clearskies-load-")
+    os.environ.setdefault("NTFY_TOPICS", "loadtest")
+    import main
+    import tracing
+    from config import LATITUDE, LONGITUDE
+    from night import NightContext
+
+    sites = load_sites((LATITUDE, LONGITUDE), n_sites)
+
+    def one(site):
+        start = time.perf_counter()
+        try:
+            result = outcome(main.run(NightContext(*site)))
+        except Exception as e:
+            result = f"error: {type(e).__name__}"
+        return time.perf_counter() - start, result
+
+    tracing.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        runs = list(pool.map(one, sites))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in runs]
+    outcomes = {}
+    for _, result in runs:
+        outcomes[result] = outcomes.get(result, 0) + 1
+    spans = tracing.get_spans()
+    return {
+        "runs": len(runs),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(runs) / wall, 2) if wall else 0.0,
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 90, 99)}
+        | {"max": round(max(latencies, default=0) * 1000, 1)},
+        "outcomes": outcomes,
+        "http": {
+            "requests": sum(1 for s in spans if s["span"].startswith("http.")),
+            # 304 answers a conditional GET for a cached forecast; only errors and no reply are failures
+            "failed": sum(1 for s in spans if s["span"].startswith("http.")
+                          and (s.get("status") is None or s["status"] >= 400)),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of main.run against local fakes.")
+    parser.add_argument("--sites", type=int, default=200, help="number of sites to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent runs")
+    parser.add_argument("--latency", type=float, default=20, help="fake server latency per request (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--cloud-cover", type=int, help="fixed cloud cover %% (default: varies by site/day)")
+    parser.add_argument("--forecast", help="recorded Open-Meteo response (JSON) to serve")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.forecast:
+        with open(args.forecast) as f:
+            recorded = json.load(f)
+    with running(latency_ms=args.latency, error_rate=args.error_rate, recorded=recorded,
+                 cloud_cover=args.cloud_cover) as (url, state):
+        report = drive(url, args.sites, args.concurrency)
+        report["server"] = dict(state.counts)
+
+    print(f"{report['runs']} runs in {report['wall_s']:.2f}s ({report['throughput_per_s']:.1f}/s, "
+          f"concurrency {report['concurrency']})")
+    lat = report["latency_ms"]
+    print(f"Latency: p50 {lat['p50']:.0f} ms | p90 {lat['p90']:.0f} ms | p99 {lat['p99']:.0f} ms | max {lat['max']:.0f} ms")
+    print(f"Outcomes: {', '.join(f'{k} {v}' for k, v in sorted(report['outcomes'].items()))}")
+    print(f"Server: {', '.join(f'{k} {v}' for k, v in report['server'].items())}")
+    print(f"Client HTTP: {report['http']['requests']} requests, {report['http']['failed']} failed after retries")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
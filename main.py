@@ -1,60 +1,33 @@
 """Clear Skies Tonight - Main orchestrator."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+from night import NightContext, get_night_context
 from weather import get_weather
 from moon import get_moon_info
-from targets import get_recommendations
-from notifier import send_notification
-from config import MIN_TARGET_SCORE, MIN_CONDITIONS_SCORE, TOP_TARGETS_COUNT
+from scoring import conditions_score
+from config import (
+    MIN_TARGET_SCORE, MIN_CONDITIONS_SCORE, TOP_TARGETS_COUNT, ENSEMBLE_MODEL, MIN_CLEAR_PROBABILITY,
+    TRACE_JSONL, METRICS_TEXTFILE, PROFILE_PATH,
+)
 
 
 def assess_conditions(weather: dict, moon: dict) -> tuple[int, str]:
     """Score overall conditions 1-10 and return summary.
 
+    Cloud cover, humidity, wind and (while it is up) the moon deduct from a
+    perfect 10 per the tables in scoring.py.
+
     Returns:
         (score, summary_text)
     """
-    score = 10  # Start perfect, deduct for issues
-    issues = []
-
-    # Cloud cover (biggest factor)
-    clouds = weather["cloud_cover"]
-    if clouds > 80:
-        score -= 5
-        issues.append(f"Cloudy ({clouds}%)")
-    elif clouds > 50:
-        score -= 3
-        issues.append(f"Partly cloudy ({clouds}%)")
-    elif clouds > 25:
-        score -= 1
-        issues.append(f"Some clouds ({clouds}%)")
-
-    # Humidity (affects transparency)
-    humidity = weather["humidity"]
-    if humidity > 90:
-        score -= 2
-        issues.append("Very humid")
-    elif humidity > 80:
-        score -= 1
-        issues.append("Humid")
-
-    # Wind (affects tracking)
-    wind = weather["wind_mph"]
-    if wind > 15:
-        score -= 2
-        issues.append(f"Windy ({wind:.0f} mph)")
-    elif wind > 10:
-        score -= 1
-        issues.append(f"Breezy ({wind:.0f} mph)")
-
-    # Moon phase (for DSO imaging)
-    if moon["phase_pct"] > 75 and moon["is_up"]:
-        score -= 2
-        issues.append(f"Bright moon ({moon['phase_pct']:.0f}%)")
-    elif moon["phase_pct"] > 50 and moon["is_up"]:
-        score -= 1
-        issues.append(f"Moon up ({moon['phase_pct']:.0f}%)")
-
-    score = max(1, score)  # Floor at 1
+    score, issues = conditions_score({
+        "cloud_cover": weather["cloud_cover"],
+        "humidity": weather["humidity"],
+        "wind_mph": weather["wind_mph"],
+        "moon_phase": moon["phase_pct"],
+    }, moon_up=moon["is_up"])
 
     if not issues:
         summary = "Excellent conditions!"
@@ -76,60 +49,182 @@ def get_priority(conditions_score: int, best_target_score: float) -> str:
         return "low"
 
 
-def run():
-    """Main entry point."""
-    # Gather data
-    weather = get_weather()
-    if not weather:
-        print("Failed to fetch weather")
-        return
+def _traced(timings: dict, stage: str, fn, *args, **kwargs):
+    """Call fn inside a tracing span and record its wall time under timings[stage]."""
+    with tracing.span(stage) as record:
+        result = fn(*args, **kwargs)
+    timings[stage] = record["duration_s"]
+    return result
 
-    moon = get_moon_info()
-    targets = get_recommendations()
 
-    # Assess conditions
-    conditions_score, conditions_summary = assess_conditions(weather, moon)
+def gather(ctx: NightContext) -> tuple[dict | None, dict, dict]:
+    """Fetch the forecast while the moon math runs.
 
-    # Get top targets
-    good_targets = [t for t in targets if t["score"] >= MIN_TARGET_SCORE][:TOP_TARGETS_COUNT]
+    Targets are not computed here: they are only needed once conditions
+    pass, so run() asks for them lazily (see decide).
 
-    # Decide whether to notify
-    if conditions_score < MIN_CONDITIONS_SCORE:
-        print(f"Conditions poor ({conditions_score}/10): {conditions_summary}")
-        print("No notification sent.")
-        return
+    Returns:
+        (weather, moon, timings) where timings maps stage -> seconds
+    """
+    timings = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        weather = pool.submit(_traced, timings, "weather", get_weather, ctx)
+        moon = _traced(timings, "moon", get_moon_info, ctx)
+        weather = weather.result()
+    timings = {stage: timings[stage] for stage in ("weather", "moon")}
+    timings["total"] = time.perf_counter() - start
+    return weather, moon, timings
+
+
+def _recommendations(ctx: NightContext):
+    # Deferred: targets pulls in numpy and the catalog, which cloudy nights never need
+    from targets import get_top_targets
+    # Only the notification's targets are needed, so skip ranking the rest
+    return get_top_targets(TOP_TARGETS_COUNT, ctx=ctx, min_score=MIN_TARGET_SCORE)
+
+
+def ensemble_check(ctx: NightContext, timings: dict | None = None):
+    """Lazy clear-sky probability for decide(), or None with ensembles off (CLEARSKIES_ENSEMBLE).
+
+    Every entry point passes this, so they all gate and word the notification alike.
+    """
+    if not ENSEMBLE_MODEL:
+        return None
+
+    def ensemble():
+        from ensemble import get_clear_probability  # Deferred like targets: only needed once conditions pass
+        return _traced({} if timings is None else timings, "ensemble", get_clear_probability, ctx)
+    return ensemble
+
+
+def format_timings(timings: dict) -> str:
+    """One-line per-stage timing report, with time saved by overlapping."""
+    stages = [k for k in timings if k != "total"]
+    parts = [f"{k} {timings[k]:.2f}s" for k in stages]
+    sequential = sum(timings[k] for k in stages)
+    return (f"Timings: {' | '.join(parts)} | wall {timings['total']:.2f}s "
+            f"(saved {max(0.0, sequential - timings['total']):.2f}s)")
+
+
+def decide(weather: dict, moon: dict, targets, min_conditions_score: int = MIN_CONDITIONS_SCORE,
+           min_target_score: float = MIN_TARGET_SCORE, top: int = TOP_TARGETS_COUNT,
+           ensemble=None, min_clear_probability: float = MIN_CLEAR_PROBABILITY) -> dict:
+    """Assess conditions and build the notification, if one is warranted.
+
+    Args:
+        weather, moon: tonight's forecast and moon info
+        targets: ranked targets, or a callable returning them; the callable
+            is only invoked if conditions pass
+        min_conditions_score, min_target_score, top: thresholds (default: config)
+        ensemble: optional clear-sky probability (see ensemble.py), or a
+            callable returning it, checked once conditions pass
+        min_clear_probability: probability of usable skies needed to notify
+
+    Returns:
+        dict with conditions_score, conditions_summary, notify (bool), and
+        either reason (why not) or title, message, priority and best target
+    """
+    # Assess conditions
+    with tracing.span("assess_conditions"):
+        conditions_score, conditions_summary = assess_conditions(weather, moon)
+    decision = {"conditions_score": conditions_score, "conditions_summary": conditions_summary, "notify": False}
+
+    # Decide whether to notify (cheap weather/moon gate before any target math)
+    if conditions_score < min_conditions_score:
+        decision["reason"] = f"Conditions poor ({conditions_score}/10): {conditions_summary}"
+        return decision
+
+    if callable(ensemble):
+        ensemble = ensemble()
+    if ensemble:
+        decision["clear_probability"] = ensemble
+        if ensemble["probability"] < min_clear_probability:
+            decision["reason"] = (f"Ensemble: only {ensemble['probability']:.0%} chance of usable skies "
+                                  f"({ensemble['low']:.0%}-{ensemble['high']:.0%}).")
+            return decision
+
+    if callable(targets):
+        targets = targets()
 
+    # Get top targets
+    good_targets = [t for t in targets if t["score"] >= min_target_score][:top]
     if not good_targets:
-        print("No targets scoring 6+ tonight.")
-        print("No notification sent.")
-        return
+        decision["reason"] = f"No targets scoring {min_target_score}+ tonight."
+        return decision
 
     # Build notification
-    best = good_targets[0]
+    best = dict(good_targets[0])  # Plain dict, so decisions can be saved as JSON
     title = f"Clear Skies Tonight [{conditions_score}/10]"
 
     lines = [conditions_summary]
     lines.append(f"Window: {moon['window_start']} - {moon['window_end']}")
+    if ensemble:
+        lines.append(f"Clear-sky chance: {ensemble['probability']:.0%} "
+                     f"({ensemble['low']:.0%}-{ensemble['high']:.0%} across {ensemble['members']} ensemble members)")
     lines.append("")
     lines.append("Top targets:")
     for i, t in enumerate(good_targets, 1):
         lines.append(f"{i}. {t['name']} [{t['score']}/10] peak @ {t['transit_time']}")
 
-    message = "\n".join(lines)
-    priority = get_priority(conditions_score, best["score"])
+    decision.update(
+        notify=True,
+        title=title,
+        message="\n".join(lines),
+        priority=get_priority(conditions_score, best["score"]),
+        best=best,
+        targets=[t["name"] for t in good_targets],
+    )
+    return decision
+
+
+def run(ctx: NightContext | None = None) -> dict | None:
+    """Main entry point.
+
+    Returns:
+        The decision (see decide), with per-topic "delivery" status if a
+        notification was sent, or None if the forecast could not be fetched
+    """
+    # Gather data (one shared context so every module sees the same night)
+    ctx = ctx or get_night_context()
+    start = time.perf_counter()
+    weather, moon, timings = gather(ctx)
+    if not weather:
+        print(format_timings(timings))
+        print("Failed to fetch weather")
+        return None
+
+    decision = decide(weather, moon, lambda: _traced(timings, "targets", _recommendations, ctx),
+                      ensemble=ensemble_check(ctx, timings))
+    timings["total"] = time.perf_counter() - start
+    print(format_timings(timings))
+    if not decision["notify"]:
+        print(decision["reason"])
+        print("No notification sent.")
+        return decision
 
     # Send it
-    print(f"Conditions: {conditions_score}/10 - {conditions_summary}")
+    best, priority = decision["best"], decision["priority"]
+    print(f"Conditions: {decision['conditions_score']}/10 - {decision['conditions_summary']}")
     print(f"Best target: {best['name']} [{best['score']}/10]")
     print(f"Priority: {priority}")
     print()
 
-    success = send_notification(title, message, priority)
-    if success:
-        print("Notification sent!")
+    from notifier import deliver  # Deferred with its HTTP stack until there is news to send
+    with tracing.span("notify", priority=priority):
+        status = deliver(decision["title"], decision["message"], priority, night=ctx.evening)
+    if all(s == "duplicate" for s in status.values()):
+        print("Notification already sent tonight.")
+    elif "queued" in status.values():
+        queued = sum(s == "queued" for s in status.values())
+        print(f"Notification failed for {queued}/{len(status)} topics (queued for retry)!")
     else:
-        print("Notification failed!")
+        print("Notification sent!")
+    decision["delivery"] = status
+    return decision
 
 
 if __name__ == "__main__":
-    run()
+    with tracing.profiled(PROFILE_PATH):
+        run()
+    tracing.export(TRACE_JSONL, METRICS_TEXTFILE)
@@ -1,46 +1,23 @@
 """Moon phase and position calculations."""
 
 import ephem
-import pytz
-from datetime import datetime, timezone
-from config import LATITUDE, LONGITUDE, TIMEZONE
+from night import NightContext, ephem_to_local, get_night_context
 
-LOCAL_TZ = pytz.timezone(TIMEZONE)
 
-
-def ephem_to_local(ephem_date) -> datetime:
-    """Convert ephem date to local timezone datetime."""
-    utc_dt = ephem.Date(ephem_date).datetime().replace(tzinfo=pytz.UTC)
-    return utc_dt.astimezone(LOCAL_TZ)
-
-
-def get_observer_tonight() -> ephem.Observer:
+def get_observer_tonight(ctx: NightContext | None = None) -> ephem.Observer:
     """Create an observer for tonight's prime viewing time (2 hrs after sunset)."""
-    obs = ephem.Observer()
-    obs.lat = str(LATITUDE)
-    obs.lon = str(LONGITUDE)
-    obs.date = datetime.now(timezone.utc)
-
-    # Get next sunset
-    sun = ephem.Sun()
-    try:
-        next_sunset = obs.next_setting(sun)
-    except ephem.AlwaysUpError:
-        next_sunset = obs.date
-
-    # Set time to 2 hours after sunset
-    obs.date = ephem.Date(next_sunset + 2 * ephem.hour)
-    return obs
+    ctx = ctx or get_night_context()
+    return ctx.observer()
 
 
-def get_moon_info() -> dict:
+def get_moon_info(ctx: NightContext | None = None) -> dict:
     """Get moon information for tonight.
 
     Returns:
         dict with phase_pct, altitude_deg, rising, setting, phase_name, viewing_window
     """
-    obs = get_observer_tonight()
-    moon = ephem.Moon(obs)
+    ctx = ctx or get_night_context()
+    moon = ctx.moon
 
     # Phase percentage (0 = new, 100 = full)
     phase_pct = moon.phase
@@ -51,7 +28,7 @@ def get_moon_info() -> dict:
     # Rise and set times (raw for calculations)
     moon_rise_time = None
     try:
-        moon_rise_time = obs.next_rising(moon)
+        moon_rise_time = ctx.moon_rise
         rising = ephem_to_local(moon_rise_time).strftime("%-I:%M %p")
     except ephem.AlwaysUpError:
         rising = "Always up"
@@ -59,7 +36,7 @@ def get_moon_info() -> dict:
         rising = "Never rises"
 
     try:
-        setting = ephem_to_local(obs.next_setting(moon)).strftime("%-I:%M %p")
+        setting = ephem_to_local(ctx.moon_set).strftime("%-I:%M %p")
     except ephem.AlwaysUpError:
         setting = "Always up"
     except ephem.NeverUpError:
@@ -78,23 +55,15 @@ def get_moon_info() -> dict:
         phase_name = "Full Moon"
 
     # Calculate viewing window
-    sun = ephem.Sun()
-    obs_now = ephem.Observer()
-    obs_now.lat = str(LATITUDE)
-    obs_now.lon = str(LONGITUDE)
-    obs_now.date = datetime.now(timezone.utc)
-
-    sunset = obs_now.next_setting(sun)
-    sunrise = obs_now.next_rising(sun)
-
-    window_start = ephem_to_local(ephem.Date(sunset + 2 * ephem.hour)).strftime("%-I:%M %p")
+    sunrise = ctx.sunrise
+    window_start = ephem_to_local(ctx.viewing_time).strftime("%-I:%M %p")
 
     # Window ends at moon rise (if bright moon) or sunrise - 1hr
     if phase_pct > 50 and moon_rise_time and moon_rise_time < sunrise:
         window_end = ephem_to_local(moon_rise_time).strftime("%-I:%M %p")
         window_note = "moon rise"
     else:
-        window_end = ephem_to_local(ephem.Date(sunrise - 1 * ephem.hour)).strftime("%-I:%M %p")
+        window_end = ephem_to_local(ctx.dawn).strftime("%-I:%M %p")
         window_note = "dawn"
 
     return {
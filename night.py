@@ -0,0 +1,164 @@
+"""Shared sun, moon and observer state for one site and night."""
+
+import ephem
+import pytz
+import threading
+import tracing
+from datetime import date, datetime, time, timedelta, timezone
+from functools import cached_property, lru_cache
+from config import LATITUDE, LONGITUDE, TIMEZONE
+
+LOCAL_TZ = pytz.timezone(TIMEZONE)
+
+
+def ephem_to_local(ephem_date) -> datetime:
+    """Convert ephem date to local timezone datetime."""
+    utc_dt = ephem.Date(ephem_date).datetime().replace(tzinfo=pytz.UTC)
+    return utc_dt.astimezone(LOCAL_TZ)
+
+
+def solar_date(when: datetime, lon: float) -> date:
+    """Date at a longitude in local mean solar time (UTC + lon/15 hours)."""
+    return (when.astimezone(timezone.utc) + timedelta(hours=lon / 15)).date()
+
+
+class NightContext:
+    """Sun and moon events for one (site, night), each solved at most once.
+
+    Every module reads the same instants from here, so the weather hour,
+    moon window and target positions all refer to the same moment.
+
+    The night is found from the site's own noon, in local mean solar time,
+    so a site in another timezone than TIMEZONE (a dark site, a club
+    member, an archive) still resolves to its own evening. Clock times
+    shown to the user stay in TIMEZONE (ephem_to_local).
+
+    Args:
+        lat, lon: site coordinates in degrees
+        night: the site's date of the evening; defaults to tonight (the next sunset)
+    """
+
+    def __init__(self, lat: float = LATITUDE, lon: float = LONGITUDE, night: date | None = None):
+        self.lat = lat
+        self.lon = lon
+
+        now = datetime.now(timezone.utc)
+        evening = night or solar_date(now, lon)
+        noon = datetime.combine(evening, time(12), tzinfo=timezone.utc) - timedelta(hours=lon / 15)
+        self.anchor = ephem.Date(noon if night else max(noon, now))
+        self._events = {}
+        self._lock = threading.RLock()  # Modules may read the context from worker threads
+
+    def observer(self, when=None) -> ephem.Observer:
+        """Fresh observer at the site, set to `when` (default: viewing time)."""
+        obs = ephem.Observer()
+        obs.lat = str(self.lat)
+        obs.lon = str(self.lon)
+        obs.date = self.viewing_time if when is None else when
+        return obs
+
+    def _memo(self, key: str, solve):
+        """Compute a value once; ephem failures are memoized and re-raised."""
+        with self._lock:
+            if key not in self._events:
+                tracing.count("ephem_calls")
+                try:
+                    self._events[key] = solve()
+                except (ephem.AlwaysUpError, ephem.NeverUpError) as e:
+                    self._events[key] = e
+        result = self._events[key]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _event(self, key: str, method: str, body_cls, start) -> ephem.Date:
+        """Solve a rise/set event once."""
+        return self._memo(key, lambda: getattr(self.observer(start), method)(body_cls()))
+
+    @cached_property
+    def sunset(self) -> ephem.Date:
+        try:
+            return self._event("sunset", "next_setting", ephem.Sun, self.anchor)
+        except ephem.AlwaysUpError:
+            return self.anchor
+
+    @cached_property
+    def sunrise(self) -> ephem.Date:
+        return self._event("sunrise", "next_rising", ephem.Sun, self.sunset)
+
+    @cached_property
+    def evening(self) -> date:
+        """The site's date of this night's sunset (see solar_date)."""
+        return solar_date(ephem.Date(self.sunset).datetime().replace(tzinfo=timezone.utc), self.lon)
+
+    @cached_property
+    def viewing_time(self) -> ephem.Date:
+        """Prime viewing time: 2 hrs after sunset."""
+        return ephem.Date(self.sunset + 2 * ephem.hour)
+
+    @cached_property
+    def dawn(self) -> ephem.Date:
+        """End of the dark window: 1 hr before sunrise."""
+        return ephem.Date(self.sunrise - 1 * ephem.hour)
+
+    @property
+    def window(self) -> tuple[ephem.Date, ephem.Date]:
+        """Dark window from viewing time to dawn."""
+        return self.viewing_time, self.dawn
+
+    @property
+    def moon(self) -> ephem.Moon:
+        """Moon computed for the viewing time."""
+        return self._memo("moon", lambda: ephem.Moon(self.observer()))
+
+    @cached_property
+    def bodies(self):
+        """Interpolated Sun, Moon and planet positions (solarsystem.BodyCache) for this night.
+
+        Covers the anchor through the following 2.5 days, which includes every
+        event above. Built on first use only.
+        """
+        from solarsystem import BodyCache  # Deferred: numpy stays out of cloudy runs
+        with self._lock:
+            return BodyCache(self.observer(self.anchor), self.anchor, self.anchor + 2.5)
+
+    def twilight(self, depth: str | float = "astronomical") -> tuple[ephem.Date, ephem.Date] | None:
+        """Dusk and dawn for a twilight depth (name or degrees), or None if the sun never gets that low."""
+        found = self.bodies.twilight(self.sunset, self.sunrise, depth)
+        if not found["dusk"] or not found["dawn"]:
+            return None
+        return found["dusk"][0], found["dawn"][-1]
+
+    @property
+    def moon_rise(self) -> ephem.Date:
+        """Next moon rise after the viewing time (raises like ephem)."""
+        return self._event("moon_rise", "next_rising", ephem.Moon, self.viewing_time)
+
+    @property
+    def moon_set(self) -> ephem.Date:
+        """Next moon set after the viewing time (raises like ephem)."""
+        return self._event("moon_set", "next_setting", ephem.Moon, self.viewing_time)
+
+
+@lru_cache(maxsize=32)
+def _cached_context(lat: float, lon: float, night: date | None, today: date) -> NightContext:
+    return NightContext(lat, lon, night)
+
+
+def get_night_context(lat: float = LATITUDE, lon: float = LONGITUDE,
+                      night: date | None = None) -> NightContext:
+    """Memoized NightContext for a (site, night); tonight by default."""
+    return _cached_context(lat, lon, night, solar_date(datetime.now(timezone.utc), lon))
+
+
+if __name__ == "__main__":
+    ctx = get_night_context()
+    fmt = "%-I:%M %p"
+    print(f"Sunset: {ephem_to_local(ctx.sunset).strftime(fmt)}")
+    print(f"Viewing time: {ephem_to_local(ctx.viewing_time).strftime(fmt)}")
+    print(f"Dawn: {ephem_to_local(ctx.dawn).strftime(fmt)}")
+    print(f"Sunrise: {ephem_to_local(ctx.sunrise).strftime(fmt)}")
+    dark = ctx.twilight()
+    if dark:
+        print(f"Astronomical dark: {ephem_to_local(dark[0]).strftime(fmt)} - {ephem_to_local(dark[1]).strftime(fmt)}")
+    print(f"Moon: {ctx.moon.phase:.0f}% lit")
@@ -1,37 +1,280 @@
-"""ntfy.sh push notification integration."""
+"""ntfy.sh push notification integration.
 
+Sends go through a pooled session with timeouts and retry/backoff. Failed
+sends are kept in an on-disk outbox and retried on the next delivery until
+their night is over, and each (topic, message) is delivered at most once
+per night.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
 import requests
-from config import NTFY_TOPIC
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    NTFY_TOPIC, NTFY_SERVER, NTFY_TOPICS, NTFY_TIMEOUT, NOTIFY_WORKERS, OUTBOX_MAX_AGE_HOURS,
+    CACHE_DIR, HTTP_RETRIES,
+)
+
+NTFY_URL = f"{NTFY_SERVER}/{NTFY_TOPIC}"
+OUTBOX_PATH = os.path.join(CACHE_DIR, "outbox.json")
+SENT_PATH = os.path.join(CACHE_DIR, "sent.json")
+LOCK_PATH = os.path.join(CACHE_DIR, "notifier.lock")
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+_session = None
+_file_lock = threading.Lock()
 
-NTFY_URL = f"https://ntfy.sh/{NTFY_TOPIC}"
+
+def get_session() -> requests.Session:
+    """Shared HTTP session, pooled for concurrent fan-out, with retry/backoff.
+
+    A publish is not idempotent: after a read timeout or a 5xx, ntfy may
+    already have delivered it. Only failures where it certainly wasn't
+    accepted are retried (connection errors and 429); the rest go to the
+    outbox and are deduped on the next delivery.
+    """
+    global _session
+    if _session is None:
+        retry = Retry(
+            total=HTTP_RETRIES,
+            read=0,
+            backoff_factor=0.5,  # 0.5s, 1s, 2s...
+            status_forcelist=(429,),
+            allowed_methods=("POST",),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NOTIFY_WORKERS, max_retries=retry)
+        _session = requests.Session()
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
 
 
-def send_notification(title: str, message: str, priority: str = "default") -> bool:
+def send_notification(title: str, message: str, priority: str = "default", topic: str = NTFY_TOPIC) -> bool:
     """Send a push notification via ntfy.sh.
 
     Args:
         title: Notification title
         message: Notification body
         priority: min, low, default, high, urgent
+        topic: ntfy topic to publish to
 
     Returns:
         True if successful, False otherwise
     """
+    body = message.encode("utf-8")
     try:
-        response = requests.post(
-            NTFY_URL,
-            data=message.encode("utf-8"),
-            headers={
-                "Title": title,
-                "Priority": priority,
-            },
-        )
+        with tracing.span("http.ntfy", topic=topic, bytes=len(body)) as record:
+            response = get_session().post(
+                f"{NTFY_SERVER}/{topic}",
+                data=body,
+                headers={
+                    "Title": title,
+                    "Priority": priority,
+                },
+                timeout=NTFY_TIMEOUT,
+            )
+            record["status"] = response.status_code
+        tracing.count("http_requests")
+        tracing.count("http_bytes", len(body))
         return response.status_code == 200
     except Exception as e:
-        print(f"Notification failed: {e}")
+        print(f"Notification failed ({topic}): {e}")
         return False
 
 
+def _load(path: str, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _save(path: str, value):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Notifier state write failed: {e}")
+
+
+@contextlib.contextmanager
+def _state_lock():
+    """Exclusive use of sent.json and outbox.json, across threads and processes.
+
+    Held only while the state is read and written, never across sends, so
+    an overlapping run (cron and daemon, or concurrent main.run calls)
+    doesn't overwrite the other's entries or wait on its HTTP calls.
+    """
+    with _file_lock:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            handle = open(LOCK_PATH, "a")
+        except OSError as e:
+            print(f"Notifier lock unavailable: {e}")
+            handle = None
+        try:
+            if handle and fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+        finally:
+            if handle:
+                handle.close()  # Closing releases the flock
+
+
+def message_key(topic: str, title: str, message: str, priority: str) -> str:
+    """Dedupe key for one message to one topic."""
+    text = "\0".join((topic, title, message, priority))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _fan_out(jobs: list) -> list:
+    """Send outbox-style jobs concurrently; returns one success flag per job."""
+    def send(job):
+        return send_notification(job["title"], job["message"], job["priority"], job["topic"])
+
+    if len(jobs) <= 1:
+        return [send(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=min(NOTIFY_WORKERS, len(jobs))) as pool:
+        return list(pool.map(send, jobs))
+
+
+def _deliver(new_jobs: list, night: str | None = None) -> dict:
+    """Send new jobs plus anything still waiting in the outbox.
+
+    Jobs are claimed in sent.json before sending and released to the
+    outbox if the send fails, so an overlapping run skips them as
+    duplicates instead of sending them too.
+
+    Args:
+        new_jobs: jobs from _job
+        night: the current night (ISO date); queued jobs for earlier nights are dropped
+
+    Returns:
+        dict of job key -> "sent", "duplicate" or "queued"
+    """
+    status = {}
+    pending = {}
+    with _state_lock():
+        sent = _load(SENT_PATH, {})
+        cutoff = time.time() - OUTBOX_MAX_AGE_HOURS * 3600  # Backstop when no night is given
+        queued = [j for j in _load(OUTBOX_PATH, []) if j["queued"] >= cutoff and (night is None or j["night"] >= night)]
+        for job in queued + new_jobs:
+            if job["key"] in sent.get(job["night"], []):
+                status[job["key"]] = "duplicate"
+            else:
+                pending.setdefault(job["key"], job)  # A new job already in the outbox is sent once
+        for job in pending.values():
+            sent.setdefault(job["night"], []).append(job["key"])
+
+        # Dedupe state only matters for recent nights
+        sent = {n: keys for n, keys in sorted(sent.items())[-7:]}
+        _save(SENT_PATH, sent)
+        _save(OUTBOX_PATH, [])  # Everything left is claimed above or a duplicate
+
+    jobs = list(pending.values())
+    if jobs:
+        with tracing.span("ntfy.fan_out", messages=len(jobs)):
+            results = _fan_out(jobs)
+    else:
+        results = []
+
+    failed = []
+    for job, ok in zip(jobs, results):
+        status[job["key"]] = "sent" if ok else "queued"
+        if not ok:
+            failed.append(job)
+    tracing.count("notifications_sent", sum(results))
+    tracing.count("notifications_queued", len(failed))
+
+    if failed:
+        # Release the claims and queue for retry (another run may have written since)
+        with _state_lock():
+            sent = _load(SENT_PATH, {})
+            outbox = _load(OUTBOX_PATH, [])
+            for job in failed:
+                keys = sent.get(job["night"], [])
+                if job["key"] in keys:
+                    keys.remove(job["key"])
+                outbox.append(job)
+            _save(SENT_PATH, sent)
+            _save(OUTBOX_PATH, outbox)
+    return status
+
+
+def _job(topic: str, title: str, message: str, priority: str, night: str) -> dict:
+    return {
+        "topic": topic,
+        "title": title,
+        "message": message,
+        "priority": priority,
+        "night": night,
+        "key": message_key(topic, title, message, priority),
+        "queued": time.time(),
+    }
+
+
+def deliver(title: str, message: str, priority: str = "default", topics: list = NTFY_TOPICS,
+            night: date | None = None) -> dict:
+    """Send one notification to many topics, at most once per topic per night.
+
+    Sends run concurrently; failures go to the outbox and are retried by
+    the next deliver() or flush_outbox() call.
+
+    Args:
+        title, message, priority: as for send_notification
+        topics: ntfy topics to fan out to
+        night: night the message is about (default: today), the dedupe scope
+
+    Returns:
+        dict of topic -> "sent", "duplicate" (already sent tonight) or "queued" (will retry)
+    """
+    night = (night or date.today()).isoformat()
+    jobs = [_job(topic, title, message, priority, night) for topic in topics]
+    status = _deliver(jobs, night)
+    return {job["topic"]: status[job["key"]] for job in jobs}
+
+
+def deliver_many(messages: list, night: date | None = None) -> list:
+    """Send different messages to different topics in one concurrent fan-out.
+
+    Args:
+        messages: dicts with topic, title, message and priority
+        night: dedupe scope, as for deliver
+
+    Returns:
+        One status per message: "sent", "duplicate" or "queued"
+    """
+    night = (night or date.today()).isoformat()
+    jobs = [_job(m["topic"], m["title"], m["message"], m["priority"], night) for m in messages]
+    status = _deliver(jobs, night)
+    return [status[job["key"]] for job in jobs]
+
+
+def flush_outbox(night: date | None = None) -> dict:
+    """Retry queued sends; returns job key -> status.
+
+    Args:
+        night: the current night; sends queued for earlier nights are dropped
+    """
+    return _deliver([], night and night.isoformat())
+
+
 if __name__ == "__main__":
     # Test notification
     success = send_notification(
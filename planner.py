@@ -0,0 +1,96 @@
+"""Multi-night planner: rank the upcoming nights from one forecast fetch."""
+
+import argparse
+from datetime import timedelta
+from statistics import mean
+from config import LATITUDE, LONGITUDE, MIN_TARGET_SCORE, PLANNER_DAYS, VISIBILITY_MODE
+from main import assess_conditions
+from moon import get_moon_info
+from night import NightContext, ephem_to_local
+from targets import get_top_targets
+from weather import fetch_forecast, forecast_params, hourly_row, window_indices
+
+MAX_FORECAST_DAYS = 16
+
+
+def summarize_window(hourly: dict, indices: list) -> dict:
+    """Collapse a night's hourly rows into one weather dict for scoring.
+
+    Cloud and humidity are averaged over the dark window, wind takes the
+    worst hour, and clear_hours counts hours at 25% cloud or less.
+    """
+    rows = [hourly_row(hourly, i) for i in indices]
+    return {
+        "cloud_cover": round(mean(r["cloud_cover"] for r in rows)),
+        "humidity": round(mean(r["humidity"] for r in rows)),
+        "visibility_mi": min(r["visibility_mi"] for r in rows),
+        "wind_mph": max(r["wind_mph"] for r in rows),
+        "temperature_f": min(r["temperature_f"] for r in rows),
+        "forecast_hour": rows[0]["forecast_hour"],
+        "clear_hours": sum(1 for r in rows if r["cloud_cover"] <= 25),
+    }
+
+
+def plan_nights(days: int = PLANNER_DAYS, lat: float = LATITUDE, lon: float = LONGITUDE,
+                top: int = 3, mode: str = VISIBILITY_MODE) -> list:
+    """Evaluate every night covered by one forecast fetch.
+
+    Args:
+        days: forecast days to request (capped at 16)
+        top: number of targets to keep per night
+
+    Returns:
+        List of night dicts sorted best first, each with date, conditions
+        score/summary, window, weather summary and top targets
+    """
+    days = min(days, MAX_FORECAST_DAYS)
+    data = fetch_forecast(forecast_params(lat, lon, days))
+    hourly = data["hourly"]
+
+    tonight = NightContext(lat, lon)
+    first_evening = tonight.evening
+    nights = []
+    for offset in range(days):
+        ctx = tonight if offset == 0 else NightContext(lat, lon, first_evening + timedelta(days=offset))
+        indices = window_indices(hourly["time"], *ctx.window)
+        last_hour = ephem_to_local(ctx.dawn).strftime("%Y-%m-%dT%H:00")
+        if not indices or hourly["time"][indices[-1]] < last_hour:
+            break  # Forecast doesn't cover this whole night
+
+        weather = summarize_window(hourly, indices)
+        moon = get_moon_info(ctx)
+        score, summary = assess_conditions(weather, moon)
+        targets = list(get_top_targets(top, mode, ctx=ctx, min_score=MIN_TARGET_SCORE))
+
+        nights.append({
+            "date": ctx.evening,
+            "conditions_score": score,
+            "summary": summary,
+            "window_start": moon["window_start"],
+            "window_end": moon["window_end"],
+            "weather": weather,
+            "moon": moon,
+            "targets": targets,
+        })
+
+    nights.sort(key=lambda n: (n["conditions_score"],
+                               n["targets"][0]["score"] if n["targets"] else 0,
+                               n["weather"]["clear_hours"]), reverse=True)
+    return nights
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank the best upcoming nights.")
+    parser.add_argument("--days", type=int, default=PLANNER_DAYS, help="nights to plan (max 16)")
+    parser.add_argument("--top", type=int, default=3, help="targets to list per night")
+    args = parser.parse_args()
+
+    nights = plan_nights(args.days, top=args.top)
+    print(f"=== Best nights in the next {args.days} days ===\n")
+    for i, n in enumerate(nights, 1):
+        print(f"{i}. {n['date']:%a %b %-d} [{n['conditions_score']}/10] {n['summary']}")
+        print(f"   Window: {n['window_start']} - {n['window_end']} | "
+              f"clear hours: {n['weather']['clear_hours']} | moon {n['moon']['phase_pct']:.0f}%")
+        for t in n["targets"]:
+            print(f"   - {t['name']} [{t['score']}/10] peak @ {t['transit_time']}")
+        print()
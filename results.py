@@ -0,0 +1,187 @@
+"""Target results as a struct of arrays, with lightweight row views.
+
+`TargetTable` keeps one typed array per field (name, type, difficulty,
+altitude, azimuth, moon_separation, visible, score, transit epoch and, in
+night mode, hours_up), so scoring, filtering and ranking are array
+operations. Indexing a table gives a `TargetRow`: a two-slot view that reads
+fields on access and behaves like the old per-target dict (row["score"],
+dict(row)), so callers that filter, slice or print targets work unchanged.
+The local "transit_time" string is only formatted for rows that are read.
+"""
+
+import csv
+import json
+import numpy as np
+from night import ephem_to_local
+
+TIME_FORMAT = "%-I:%M %p"
+
+
+def round_exact(values, digits: int = 1) -> np.ndarray:
+    """Round like Python's round() on each float, vectorized.
+
+    np.round scales by 10**digits first, which can tip values such as 1.05
+    (stored as 1.0500000000000000444) the other way. Only the elements that
+    land next to a tie go through Python's round.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.round(values, digits)
+    scaled = values * 10 ** digits
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in near_tie:
+        out.flat[i] = round(float(values.flat[i]), digits)
+    return out
+
+
+class TargetRow:
+    """Read-only view of one table row with dict-style access."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "TargetTable", index: int):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key: str):
+        if key == "transit_time":
+            return ephem_to_local(self.table.columns["transit"][self.index]).strftime(TIME_FORMAT)
+        value = self.table.columns[key][self.index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self.keys() else default
+
+    def keys(self) -> list:
+        return self.table.keys()
+
+    def as_dict(self) -> dict:
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"TargetRow({self.as_dict()!r})"
+
+
+class TargetTable:
+    """Parallel arrays of target results; see the module docstring.
+
+    Args:
+        columns: field name -> array, all the same length
+    """
+
+    __slots__ = ("columns",)
+
+    # Row keys in display order; "transit" is exposed as the formatted "transit_time"
+    FIELDS = ("name", "type", "difficulty", "altitude", "azimuth", "moon_separation", "visible",
+              "hours_up", "transit_time", "score")
+
+    def __init__(self, **columns):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["score"])
+
+    def keys(self) -> list:
+        return [k for k in self.FIELDS if k in self.columns or (k == "transit_time" and "transit" in self.columns)]
+
+    def __getitem__(self, key):
+        """Column by name, row by int, or a sub-table by slice, index array or mask."""
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            n = len(self)
+            if not -n <= key < n:
+                raise IndexError("target index out of range")
+            return TargetRow(self, int(key) % n)
+        return self.select(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TargetRow(self, i)
+
+    def select(self, index) -> "TargetTable":
+        """Rows picked by a slice, index array or boolean mask, as a new table."""
+        return TargetTable(**{k: v[index] for k, v in self.columns.items()})
+
+    def ranked(self) -> "TargetTable":
+        """Rows by descending score; ties keep their catalog order."""
+        return self.select(np.argsort(-self.columns["score"], kind="stable"))
+
+    def mask(self, types=None, difficulties=None, min_score: float | None = None) -> np.ndarray:
+        """Boolean mask of rows passing the filters (None means no filter)."""
+        keep = np.ones(len(self), dtype=bool)
+        if types is not None:
+            keep &= np.isin(self.columns["type"], list(types))
+        if difficulties is not None:
+            keep &= np.isin(self.columns["difficulty"], list(difficulties))
+        if min_score is not None:
+            keep &= self.columns["score"] >= min_score
+        return keep
+
+    def _best(self, candidates: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best candidates in rank order, without sorting the rest.
+
+        argpartition finds the k-th best score. Rows strictly better are
+        kept, and ties at that score are filled in catalog order, so the
+        result equals the first k rows of ranked().
+        """
+        score = self.columns["score"]
+        if k <= 0:
+            return candidates[:0]
+        if k < len(candidates):
+            neg = -score[candidates]
+            kth = neg[np.argpartition(neg, k - 1)[k - 1]]
+            better = candidates[neg < kth]
+            ties = candidates[neg == kth][:k - len(better)]
+            candidates = np.concatenate([better, ties])
+        return candidates[np.lexsort((candidates, -score[candidates]))]
+
+    def top(self, k: int, types=None, difficulties=None, min_score: float | None = None) -> "TargetTable":
+        """The k best rows passing the filters, in rank order."""
+        candidates = np.flatnonzero(self.mask(types, difficulties, min_score))
+        return self.select(self._best(candidates, max(0, k)))
+
+    def iter_ranked(self, chunk: int = 4096, types=None, difficulties=None, min_score: float | None = None):
+        """Yield rows passing the filters in rank order, selecting one chunk at a time.
+
+        Each chunk is the top `chunk` of the rows not yet yielded, so only
+        one chunk is ever sorted and a consumer that stops early never pays
+        for the rest.
+        """
+        score = self.columns["score"]
+        remaining = np.flatnonzero(self.mask(types, difficulties, min_score))
+        while len(remaining):
+            best = self._best(remaining, chunk)
+            for i in best:
+                yield TargetRow(self, int(i))
+            last_score, last_index = score[best[-1]], best[-1]
+            rest = score[remaining]
+            remaining = remaining[(rest < last_score) | ((rest == last_score) & (remaining > last_index))]
+
+    def to_dicts(self, limit: int | None = None) -> list:
+        """The first `limit` rows (default all) as plain dicts."""
+        return [row.as_dict() for row in self[:limit]]
+
+    def __repr__(self) -> str:
+        return f"TargetTable({len(self)} targets)"
+
+
+def write_jsonl(rows, f) -> int:
+    """Write rows as JSON lines to an open text file; returns the count."""
+    n = 0
+    for row in rows:
+        f.write(json.dumps(row.as_dict()) + "\n")
+        n += 1
+    return n
+
+
+def write_csv(rows, f) -> int:
+    """Write rows as CSV (header from the first row) to an open text file; returns the count."""
+    writer = None
+    n = 0
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(f, fieldnames=row.keys())
+            writer.writeheader()
+        writer.writerow(row.as_dict())
+        n += 1
+    return n
@@ -0,0 +1,188 @@
+"""Table-driven scoring rules for targets and sky conditions.
+
+Every factor is a step table: `edges` split the value range into bands and
+`points` gives the score of each band (one more entry than edges). A value
+moves past an edge when it is >= the edge, or > the edge where `strict` is
+set. Difficulty is a category table. The defaults reproduce the original
+if/elif rules exactly; tune them by pointing SCORING_FILE at a JSON file
+holding only the keys to override, e.g.
+
+    {"target": {"weights": {"moon_separation": 1.5}},
+     "conditions": {"factors": {"wind_mph": {"edges": [12, 20]}}}}
+
+Keys that don't exist in DEFAULT_RULES are rejected, so a misspelt
+override fails loudly instead of leaving the default in place.
+
+Scalar helpers are pure Python so the cloudy-night bail-out in main.py never
+loads numpy; the *_array functions take broadcastable arrays (targets x time
+steps x sites) and score them in one pass.
+"""
+
+import copy
+import json
+from functools import lru_cache
+from config import SCORING_FILE
+
+DEFAULT_RULES = {
+    "target": {
+        # 30-70° is optimal; high is okay, just more atmosphere at horizon
+        "altitude": {"edges": [20, 30, 70], "strict": [False, False, True], "points": [1.0, 2.0, 3.0, 2.5]},
+        # Farther from the moon is better
+        "moon_separation": {"edges": [30, 60, 90], "points": [0.5, 1.0, 2.0, 3.0]},
+        # Darker is better
+        "moon_phase": {"edges": [25, 50, 75], "points": [2.0, 1.5, 1.0, 0.5]},
+        "difficulty": {"levels": {"easy": 2.0, "medium": 1.5, "hard": 1.0}, "default": 1.0},
+        "weights": {"altitude": 1.0, "moon_separation": 1.0, "moon_phase": 1.0, "difficulty": 1.0},
+    },
+    "conditions": {
+        "base": 10,  # Start perfect, deduct for issues
+        "floor": 1,
+        "factors": {
+            "cloud_cover": {"edges": [25, 50, 80], "strict": [True, True, True], "points": [0, -1, -3, -5],
+                            "labels": [None, "Some clouds ({value}%)", "Partly cloudy ({value}%)",
+                                       "Cloudy ({value}%)"]},
+            "humidity": {"edges": [80, 90], "strict": [True, True], "points": [0, -1, -2],
+                         "labels": [None, "Humid", "Very humid"]},
+            "wind_mph": {"edges": [10, 15], "strict": [True, True], "points": [0, -1, -2],
+                         "labels": [None, "Breezy ({value:.0f} mph)", "Windy ({value:.0f} mph)"]},
+            # Moon penalty only applies while it is up
+            "moon_phase": {"edges": [50, 75], "strict": [True, True], "points": [0, -1, -2],
+                           "labels": [None, "Moon up ({value:.0f}%)", "Bright moon ({value:.0f}%)"]},
+        },
+    },
+}
+
+
+OPTIONAL_RULE_KEYS = ("strict", "labels")  # Step-table fields a default may leave out
+
+
+def _merge(base: dict, override: dict, path: str = "") -> dict:
+    """Deep-merge override into base.
+
+    Raises:
+        ValueError for a key that isn't in base (new difficulty levels and
+        the optional step-table fields are allowed)
+    """
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        where = f"{path}.{key}" if path else key
+        known = (key in merged or path.endswith("levels")
+                 or (key in OPTIONAL_RULE_KEYS and "edges" in merged))
+        if not known:
+            raise ValueError(f"unknown scoring key {where!r}")
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value, where)
+        else:
+            merged[key] = value
+    return merged
+
+
+@lru_cache(maxsize=4)
+def load_rules(path: str | None = SCORING_FILE) -> dict:
+    """Default rules with the overrides from a JSON file (if any) applied.
+
+    Raises:
+        ValueError if the file names a key DEFAULT_RULES doesn't have
+    """
+    if not path:
+        return DEFAULT_RULES
+    with open(path) as f:
+        overrides = json.load(f)
+    try:
+        return _merge(DEFAULT_RULES, overrides)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+def band(rule: dict, value: float) -> int:
+    """Index of the band that a scalar value falls in."""
+    strict = rule.get("strict") or [False] * len(rule["edges"])
+    return sum(value > e if s else value >= e for e, s in zip(rule["edges"], strict))
+
+
+def band_array(rule: dict, values):
+    """Band index for every element of an array."""
+    import numpy as np  # Deferred: see module docstring
+    values = np.asarray(values, dtype=float)
+    strict = rule.get("strict") or [False] * len(rule["edges"])
+    idx = np.zeros(values.shape, dtype=np.intp)
+    for edge, s in zip(rule["edges"], strict):
+        idx += values > edge if s else values >= edge
+    return idx
+
+
+def category_array(rule: dict, values):
+    """Points for every element of an array of category names."""
+    import numpy as np
+    values = np.asarray(values)
+    out = np.full(values.shape, float(rule["default"]))
+    for name, points in rule["levels"].items():
+        out[values == name] = points
+    return out
+
+
+def target_score(alt: float, sep: float, moon_phase: float, difficulty: str,
+                 alt_weight: float = 1.0, rules: dict | None = None) -> float:
+    """Unrounded target score for scalar inputs."""
+    rules = (rules or load_rules())["target"]
+    w = rules["weights"]
+    return (rules["altitude"]["points"][band(rules["altitude"], alt)] * alt_weight * w["altitude"]
+            + rules["moon_separation"]["points"][band(rules["moon_separation"], sep)] * w["moon_separation"]
+            + rules["moon_phase"]["points"][band(rules["moon_phase"], moon_phase)] * w["moon_phase"]
+            + rules["difficulty"]["levels"].get(difficulty, rules["difficulty"]["default"]) * w["difficulty"])
+
+
+def target_score_array(alt, sep, moon_phase, difficulty, alt_weight=1.0, rules: dict | None = None):
+    """Unrounded target scores; all arguments broadcast against each other.
+
+    Args:
+        alt, sep: altitude and moon separation in degrees
+        moon_phase: moon illumination %
+        difficulty: array of difficulty names
+        alt_weight: scale on the altitude points (night mode: time up)
+    """
+    import numpy as np
+    rules = (rules or load_rules())["target"]
+    w = rules["weights"]
+    table = {k: np.asarray(rules[k]["points"], dtype=float) for k in ("altitude", "moon_separation", "moon_phase")}
+    return (table["altitude"][band_array(rules["altitude"], alt)] * alt_weight * w["altitude"]
+            + table["moon_separation"][band_array(rules["moon_separation"], sep)] * w["moon_separation"]
+            + table["moon_phase"][band_array(rules["moon_phase"], moon_phase)] * w["moon_phase"]
+            + category_array(rules["difficulty"], difficulty) * w["difficulty"])
+
+
+def conditions_score(values: dict, moon_up: bool, rules: dict | None = None) -> tuple[int, list]:
+    """Conditions score and issue labels for one forecast.
+
+    Args:
+        values: factor name -> value (cloud_cover, humidity, wind_mph, moon_phase)
+        moon_up: whether the moon factor applies
+
+    Returns:
+        (score, issues)
+    """
+    rules = (rules or load_rules())["conditions"]
+    score = rules["base"]
+    issues = []
+    for name, rule in rules["factors"].items():
+        if name == "moon_phase" and not moon_up:
+            continue
+        i = band(rule, values[name])
+        score += rule["points"][i]
+        label = rule.get("labels", [None] * (i + 1))[i]
+        if label:
+            issues.append(label.format(value=values[name]))
+    return max(rules["floor"], score), issues
+
+
+def conditions_score_array(values: dict, moon_up, rules: dict | None = None):
+    """Conditions scores for arrays of forecasts (e.g. sites x hours)."""
+    import numpy as np
+    rules = (rules or load_rules())["conditions"]
+    score = None
+    for name, rule in rules["factors"].items():
+        points = np.asarray(rule["points"])[band_array(rule, values[name])]
+        if name == "moon_phase":
+            points = np.where(moon_up, points, 0)
+        score = points if score is None else score + points
+    return np.maximum(rules["floor"], rules["base"] + score)
@@ -0,0 +1,460 @@
+"""Vectorized sky positions for whole target catalogs.
+
+ephem computes one FixedBody at a time. This module reproduces the same
+reduction (precession, nutation, aberration, refraction) with NumPy so a
+catalog of any size is placed on the sky in a handful of array operations.
+Only per-instant quantities (sidereal time, Moon position) come from ephem.
+"""
+
+import math
+import ephem
+import numpy as np
+import tracing
+from catalog import DIFFICULTY_NAMES, TYPE_NAMES
+from horizon import clear_of
+
+SIDEREAL_RATE = 1.00273790935  # sidereal days per solar day
+ARCSEC = math.pi / (180 * 3600)
+
+# Largest terms of the IAU 1980 nutation series (Meeus, table 22.A).
+# Multipliers of D, M, M', F, Omega, then dpsi and deps in 0.0001" (+ per-century rate).
+# Dropped terms are below 0.002" each.
+NUTATION_TERMS = np.array([
+    (0, 0, 0, 0, 1, -171996, -174.2, 92025, 8.9),
+    (-2, 0, 0, 2, 2, -13187, -1.6, 5736, -3.1),
+    (0, 0, 0, 2, 2, -2274, -0.2, 977, -0.5),
+    (0, 0, 0, 0, 2, 2062, 0.2, -895, 0.5),
+    (0, 1, 0, 0, 0, 1426, -3.4, 54, -0.1),
+    (0, 0, 1, 0, 0, 712, 0.1, -7, 0),
+    (-2, 1, 0, 2, 2, -517, 1.2, 224, -0.6),
+    (0, 0, 0, 2, 1, -386, -0.4, 200, 0),
+    (0, 0, 1, 2, 2, -301, 0, 129, -0.1),
+    (-2, -1, 0, 2, 2, 217, -0.5, -95, 0.3),
+    (-2, 0, 1, 0, 0, -158, 0, 0, 0),
+    (-2, 0, 0, 2, 1, 129, 0.1, -70, 0),
+    (0, 0, -1, 2, 2, 123, 0, -53, 0),
+    (2, 0, 0, 0, 0, 63, 0, 0, 0),
+    (0, 0, 1, 0, 1, 63, 0.1, -33, 0),
+    (2, 0, -1, 2, 2, -59, 0, 26, 0),
+    (0, 0, -1, 0, 1, -58, -0.1, 32, 0),
+    (0, 0, 1, 2, 1, -51, 0, 27, 0),
+    (-2, 0, 2, 0, 0, 48, 0, 0, 0),
+    (0, 0, -2, 2, 1, 46, 0, -24, 0),
+    (2, 0, 0, 2, 2, -38, 0, 16, 0),
+    (0, 0, 2, 2, 2, -31, 0, 13, 0),
+    (0, 0, 2, 0, 0, 29, 0, 0, 0),
+    (-2, 0, 1, 2, 2, 29, 0, -12, 0),
+    (0, 0, 0, 2, 0, 26, 0, 0, 0),
+    (-2, 0, 0, 2, 0, -22, 0, 0, 0),
+    (0, 0, -1, 2, 1, 21, 0, -10, 0),
+    (0, 2, 0, 0, 0, 17, -0.1, 0, 0),
+    (2, 0, -1, 0, 1, 16, 0, -8, 0),
+    (-2, 2, 0, 2, 2, -16, 0.1, 7, 0),
+    (0, 1, 0, 0, 1, -15, 0, 9, 0),
+    (-2, 0, 1, 0, 1, -13, 0, 7, 0),
+    (0, -1, 0, 0, 1, -12, 0, 6, 0),
+])
+
+
+def unit_vectors(ra, dec) -> np.ndarray:
+    """Return (3, n) Cartesian unit vectors for RA/Dec arrays in radians."""
+    cos_dec = np.cos(dec)
+    return np.array([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+
+def _rot_x(angle: float) -> np.ndarray:
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[1, 0, 0], [0, c, s], [0, -s, c]])
+
+
+def _rot_y(angle: float) -> np.ndarray:
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, 0, -s], [0, 1, 0], [s, 0, c]])
+
+
+def _rot_z(angle: float) -> np.ndarray:
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]])
+
+
+def _centuries(date) -> float:
+    """Julian centuries since J2000 for an ephem date."""
+    return (float(date) - float(ephem.J2000)) / 36525.0
+
+
+def precession_matrix(date) -> np.ndarray:
+    """Rotation from J2000 mean equator to the mean equator of date (IAU 1976)."""
+    t = _centuries(date)
+    zeta = math.radians(0.6406161 * t + 0.0000839 * t**2 + 0.0000050 * t**3)
+    z = math.radians(0.6406161 * t + 0.0003041 * t**2 + 0.0000051 * t**3)
+    theta = math.radians(0.5567530 * t - 0.0001185 * t**2 - 0.0000116 * t**3)
+    return _rot_z(-z) @ _rot_y(theta) @ _rot_z(-zeta)
+
+
+def nutation(date) -> tuple[float, float, float]:
+    """Return (dpsi, deps, mean obliquity) in radians for an ephem date."""
+    t = _centuries(date)
+    args = np.radians([
+        297.85036 + 445267.111480 * t - 0.0019142 * t**2 + t**3 / 189474,
+        357.52772 + 35999.050340 * t - 0.0001603 * t**2 - t**3 / 300000,
+        134.96298 + 477198.867398 * t + 0.0086972 * t**2 + t**3 / 56250,
+        93.27191 + 483202.017538 * t - 0.0036825 * t**2 + t**3 / 327270,
+        125.04452 - 1934.136261 * t + 0.0020708 * t**2 + t**3 / 450000,
+    ])
+    phase = NUTATION_TERMS[:, :5] @ args
+    dpsi = np.sum((NUTATION_TERMS[:, 5] + NUTATION_TERMS[:, 6] * t) * np.sin(phase))
+    deps = np.sum((NUTATION_TERMS[:, 7] + NUTATION_TERMS[:, 8] * t) * np.cos(phase))
+    eps0 = (84381.448 - 46.8150 * t - 0.00059 * t**2 + 0.001813 * t**3) * ARCSEC
+    return float(dpsi) * 1e-4 * ARCSEC, float(deps) * 1e-4 * ARCSEC, eps0
+
+
+def apparent_place(ra, dec, date) -> tuple[np.ndarray, np.ndarray]:
+    """Convert J2000 RA/Dec arrays to apparent geocentric RA/Dec of date.
+
+    Applies precession, nutation and annual aberration the same way ephem does
+    for a FixedBody, so results agree with ``body.ra``/``body.dec`` to well
+    under an arc-second.
+    """
+    dpsi, deps, eps0 = nutation(date)
+    rotation = _rot_x(-(eps0 + deps)) @ _rot_z(-dpsi) @ _rot_x(eps0) @ precession_matrix(date)
+    vec = rotation @ unit_vectors(ra, dec)
+
+    # Earth's orbital velocity (Montenbruck), same model as ephem's ab_eq
+    lng = 2 * math.pi * (0.27908 + 100.00214 * _centuries(date))
+    vec += np.array([[-0.994e-4 * math.sin(lng)],
+                     [0.912e-4 * math.cos(lng)],
+                     [0.395e-4 * math.cos(lng)]])
+
+    app_ra = np.mod(np.arctan2(vec[1], vec[0]), 2 * math.pi)
+    app_dec = np.arctan2(vec[2], np.hypot(vec[0], vec[1]))
+    return app_ra, app_dec
+
+
+def unrefract(pressure: float, temp: float, apparent_alt) -> np.ndarray:
+    """True altitude for an apparent altitude (radians), as in libastro."""
+    aa = np.asarray(apparent_alt, dtype=float)
+    aa_deg = np.degrees(aa)
+
+    # Below 15 degrees
+    a = ((2e-5 * aa_deg + 1.96e-2) * aa_deg + 1.594e-1) * pressure
+    b = (273 + temp) * ((8.45e-2 * aa_deg + 5.05e-1) * aa_deg + 1)
+    r = np.radians(a / b)
+    low = np.where((aa < 0) & (r < 0), aa, aa - r)
+
+    # Above 15 degrees, with a smooth blend between 14.5 and 15.5 degrees
+    p = np.clip(aa_deg - 14.5, 0.0, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        high = aa - 7.888888e-5 * pressure / ((273 + temp) * np.tan(aa))
+        blend = low + (high - low) * p
+    return np.where(aa_deg < 14.5, low, np.where(aa_deg >= 15.5, high, blend))
+
+
+def refract(pressure: float, temp: float, true_alt) -> np.ndarray:
+    """Apparent altitude for a true altitude (radians), as in libastro."""
+    aa = np.array(true_alt, dtype=float)
+    if pressure == 0:
+        return aa
+
+    # libastro's correction goes to zero below about -8.3°, so only objects
+    # above that need solving; each iteration works on the unsolved ones only
+    flat = aa.reshape(-1)
+    active = np.flatnonzero(flat > math.radians(-9.0))
+    ta = flat[active]
+
+    # Secant search for the apparent altitude that unrefracts to ta
+    t0 = unrefract(pressure, temp, ta)
+    step = 0.8 * (ta - t0)
+    guess = ta.copy()
+    for _ in range(20):
+        if not len(active):
+            break
+        guess = guess + step
+        t = unrefract(pressure, temp, guess)
+        err = ta - t
+        done = np.abs(err) <= 0.1 * ARCSEC
+        flat[active[done]] = guess[done]
+
+        keep = ~done
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = -step[keep] * err[keep] / (t0[keep] - t[keep])
+        active, ta, t0, guess = active[keep], ta[keep], t[keep], guess[keep]
+    flat[active] = guess
+    return aa
+
+
+def horizontal(obs: ephem.Observer, ra, dec, lst=None) -> tuple[np.ndarray, np.ndarray]:
+    """Altitude and azimuth (radians) of apparent RA/Dec arrays for an observer.
+
+    Refraction follows the observer's pressure and temperature, like ephem.
+    ``lst`` may be an array; it broadcasts against ra/dec (e.g. targets x times).
+    """
+    if lst is None:
+        lst = float(obs.sidereal_time())
+    lat = float(obs.lat)
+    ha = lst - ra
+
+    sin_lat, cos_lat = math.sin(lat), math.cos(lat)
+    cos_dec = np.cos(dec)
+    sin_dec = np.sin(dec)
+    cos_ha = np.cos(ha)
+
+    north = sin_dec * cos_lat - cos_dec * cos_ha * sin_lat
+    east = -cos_dec * np.sin(ha)
+    up = sin_dec * sin_lat + cos_dec * cos_ha * cos_lat
+
+    alt = np.arctan2(up, np.hypot(north, east))
+    az = np.mod(np.arctan2(east, north), 2 * math.pi)
+    return refract(obs.pressure, obs.temp, alt), az
+
+
+def separation(ra, dec, ra0: float, dec0: float) -> np.ndarray:
+    """Angular separation in degrees between RA/Dec arrays and one point (radians)."""
+    vec = unit_vectors(ra, dec)
+    ref = unit_vectors(ra0, dec0)
+    dot = ref @ vec
+    cross = np.linalg.norm(np.cross(ref, vec.T), axis=1)
+    return np.degrees(np.arctan2(cross, dot))
+
+
+def rise_transit_set(obs: ephem.Observer, ra, dec, horizon: float | None = None,
+                     lst: float | None = None) -> dict:
+    """Closed-form next rise, transit and set for fixed objects after obs.date.
+
+    Solves the hour-angle equation for every object at once instead of
+    iterating per object like ephem's next_rising/next_transit/next_setting.
+
+    Args:
+        obs: Observer at the site and start instant
+        ra, dec: apparent RA/Dec of date in radians
+        horizon: apparent altitude of the horizon in radians (default obs.horizon)
+
+    Returns:
+        dict with transit, rise and set ephem dates (NaN when the object never
+        crosses the horizon) and circumpolar/never_up flags
+    """
+    if lst is None:
+        lst = float(obs.sidereal_time())
+    if horizon is None:
+        horizon = float(obs.horizon)
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    lat = float(obs.lat)
+    start = float(obs.date)
+    day = 2 * math.pi * SIDEREAL_RATE  # radians of hour angle per day
+
+    # Geometric altitude that refraction lifts onto the horizon
+    h0 = float(unrefract(obs.pressure, obs.temp, horizon))
+    cos_h = (math.sin(h0) - math.sin(lat) * np.sin(dec)) / (math.cos(lat) * np.cos(dec))
+    circumpolar = cos_h < -1
+    never_up = cos_h > 1
+    semi_arc = np.arccos(np.clip(cos_h, -1, 1))
+
+    crosses = ~(circumpolar | never_up)
+    rise = np.where(crosses, start + np.mod(ra - semi_arc - lst, 2 * math.pi) / day, np.nan)
+    sets = np.where(crosses, start + np.mod(ra + semi_arc - lst, 2 * math.pi) / day, np.nan)
+
+    return {
+        "transit": start + np.mod(ra - lst, 2 * math.pi) / day,
+        "rise": rise,
+        "set": sets,
+        "circumpolar": circumpolar,
+        "never_up": never_up,
+    }
+
+
+def sidereal_times(obs: ephem.Observer, dates) -> np.ndarray:
+    """Local apparent sidereal time (radians) at each ephem date."""
+    probe = ephem.Observer()
+    probe.lat, probe.lon, probe.elevation = obs.lat, obs.lon, obs.elevation
+    lst = np.empty(len(dates))
+    for i, date in enumerate(dates):
+        probe.date = date
+        lst[i] = float(probe.sidereal_time())
+    tracing.count("ephem_calls", len(dates))
+    return lst
+
+
+def time_grid(start, end, step_minutes: float) -> np.ndarray:
+    """Evenly spaced ephem dates from start to end inclusive, about step_minutes apart.
+
+    The last sample is end itself, never a step past it.
+    """
+    start, end = float(start), float(end)
+    n = max(2, round((end - start) / (step_minutes * ephem.minute)) + 1)
+    return np.linspace(start, end, n)
+
+
+def visibility_grid(obs: ephem.Observer, ra, dec, dates, min_alt: float,
+                    chunk_size: int = 4096, horizon: np.ndarray | None = None) -> dict:
+    """Evaluate J2000 RA/Dec arrays over a time grid (targets x times).
+
+    The catalog is processed in chunks so memory stays bounded for large
+    catalogs; apparent places are taken once at the middle of the grid.
+
+    Args:
+        obs: Observer for the site (its date is ignored)
+        ra, dec: J2000 coordinates in radians
+        dates: ephem dates of the grid steps
+        min_alt: altitude limit in degrees
+        horizon: optional per-azimuth altitude limits (see horizon.py)
+
+    Returns:
+        dict of per-target arrays: steps_up (clear of min_alt and the
+        horizon), steps_blocked (above min_alt but behind the horizon),
+        best_altitude, best_azimuth, best_time and moon_separation (at the
+        highest clear step, or the highest step if never clear)
+    """
+    limits = None if horizon is None else np.maximum(horizon, min_alt)
+    dates = np.asarray(dates, dtype=float)
+    mid = ephem.Date(dates[len(dates) // 2])
+    app_ra, app_dec = apparent_place(ra, dec, mid)
+    lst = sidereal_times(obs, dates)
+
+    probe = ephem.Observer()
+    probe.lat, probe.lon, probe.elevation = obs.lat, obs.lon, obs.elevation
+    probe.pressure, probe.temp = obs.pressure, obs.temp
+    moon = ephem.Moon()
+    moon_ra = np.empty(len(dates))
+    moon_dec = np.empty(len(dates))
+    for i, date in enumerate(dates):
+        probe.date = date
+        moon.compute(probe)
+        moon_ra[i], moon_dec[i] = float(moon.ra), float(moon.dec)
+    tracing.count("ephem_calls", len(dates))
+    moon_vec = unit_vectors(moon_ra, moon_dec)
+
+    n = len(app_ra)
+    result = {
+        "steps_up": np.zeros(n, dtype=int),
+        "steps_blocked": np.zeros(n, dtype=int),
+        "best_altitude": np.empty(n),
+        "best_azimuth": np.empty(n),
+        "best_time": np.empty(n),
+        "moon_separation": np.empty(n),
+    }
+    for start in range(0, n, chunk_size):
+        rows = slice(start, start + chunk_size)
+        alt, az = horizontal(probe, app_ra[rows, None], app_dec[rows, None], lst[None, :])
+        alt = np.degrees(alt)
+        above = alt > min_alt
+        if limits is None:
+            clear = above
+            best = np.argmax(alt, axis=1)
+        else:
+            clear = clear_of(limits, alt, az)
+            best = np.argmax(np.where(clear, alt, alt - 360), axis=1)  # Prefer clear steps
+        picked = np.arange(len(best))
+
+        cos_sep = np.clip(unit_vectors(app_ra[rows], app_dec[rows]).T @ moon_vec, -1, 1)
+        result["steps_up"][rows] = np.count_nonzero(clear, axis=1)
+        result["steps_blocked"][rows] = np.count_nonzero(above & ~clear, axis=1)
+        result["best_altitude"][rows] = alt[picked, best]
+        result["best_azimuth"][rows] = np.degrees(az[picked, best])
+        result["best_time"][rows] = dates[best]
+        result["moon_separation"][rows] = np.degrees(np.arccos(cos_sep[picked, best]))
+    return result
+
+
+def compute_catalog(obs: ephem.Observer, catalog: np.ndarray, moon: ephem.Moon,
+                    min_alt: float = 15, horizon: np.ndarray | None = None) -> dict:
+    """Batch version of targets.get_target_info for a whole catalog.
+
+    Args:
+        obs: Observer set to the instant of interest
+        catalog: catalog array (see catalog.CATALOG_DTYPE)
+        moon: Moon computed for obs
+        min_alt: altitude limit in degrees for "visible"
+        horizon: optional per-azimuth altitude limits (see horizon.py)
+
+    Returns:
+        dict of arrays keyed like get_target_info (altitude, azimuth and
+        moon_separation in degrees), plus transit/rise/set ephem dates,
+        circumpolar/never_up flags from rise_transit_set, and "masked"
+        (above min_alt but behind the horizon)
+    """
+    app_ra, app_dec = apparent_place(catalog["ra"], catalog["dec"], obs.date)
+    lst = float(obs.sidereal_time())
+    tracing.count("ephem_calls")
+
+    alt, az = horizontal(obs, app_ra, app_dec, lst)
+    altitude = np.degrees(alt)
+    above = altitude > min_alt
+    visible = above if horizon is None else above & clear_of(np.maximum(horizon, min_alt), altitude, az)
+
+    events = rise_transit_set(obs, app_ra, app_dec, lst=lst)
+    return {
+        "name": np.char.decode(catalog["name"], "utf-8"),
+        "type": TYPE_NAMES[catalog["type"]],
+        "difficulty": DIFFICULTY_NAMES[catalog["difficulty"]],
+        "altitude": altitude,
+        "azimuth": np.degrees(az),
+        "moon_separation": separation(app_ra, app_dec, float(moon.ra), float(moon.dec)),
+        "visible": visible,
+        "masked": above & ~visible,
+        **events,
+    }
+
+
+def _cross_check(obs: ephem.Observer, rows: np.ndarray, entries: list) -> tuple[dict, int]:
+    """Worst position (arcsec) and event (seconds) errors against ephem, plus flag mismatches."""
+    moon = ephem.Moon(obs)
+    batch = compute_catalog(obs, rows, moon)
+    app_ra, app_dec = apparent_place(rows["ra"], rows["dec"], obs.date)
+    worst = {"ra": 0.0, "dec": 0.0, "alt": 0.0, "az": 0.0, "transit": 0.0, "rise": 0.0, "set": 0.0}
+    flag_errors = 0
+    for i, (name, ra, dec, _, _) in enumerate(entries):
+        body = ephem.FixedBody()
+        body._ra = ephem.hours(ra)
+        body._dec = ephem.degrees(dec)
+        body.compute(obs)
+        d_ra = (app_ra[i] - float(body.ra)) * math.cos(float(body.dec))
+        worst["ra"] = max(worst["ra"], abs(d_ra) / ARCSEC)
+        worst["dec"] = max(worst["dec"], abs(app_dec[i] - float(body.dec)) / ARCSEC)
+        worst["alt"] = max(worst["alt"], abs(batch["altitude"][i] - math.degrees(body.alt)) * 3600)
+        d_az = (batch["azimuth"][i] - math.degrees(body.az) + 180) % 360 - 180
+        worst["az"] = max(worst["az"], abs(d_az) * 3600 * math.cos(float(body.alt)))
+
+        # Rise/transit/set against ephem's iterative solvers
+        worst["transit"] = max(worst["transit"], abs(obs.next_transit(body) - batch["transit"][i]) * 86400)
+        try:
+            rise, sets = obs.next_rising(body), obs.next_setting(body)
+        except ephem.AlwaysUpError:
+            flag_errors += not batch["circumpolar"][i]
+            continue
+        except ephem.NeverUpError:
+            flag_errors += not batch["never_up"][i]
+            continue
+        flag_errors += bool(batch["circumpolar"][i] or batch["never_up"][i])
+        worst["rise"] = max(worst["rise"], abs(rise - batch["rise"][i]) * 86400)
+        worst["set"] = max(worst["set"], abs(sets - batch["set"][i]) * 86400)
+    return worst, flag_errors
+
+
+if __name__ == "__main__":
+    # Cross-check against ephem, one FixedBody at a time; exits 1 if anything is out of tolerance
+    import sys
+    from catalog import from_entries
+    from targets import DSO_CATALOG, get_observer_tonight
+
+    TOLERANCE = {"ra": 1.0, "dec": 1.0, "alt": 1.0, "az": 1.0,  # arcsec
+                 "transit": 2.0, "rise": 2.0, "set": 2.0}  # seconds
+    UNITS = {"transit": "s", "rise": "s", "set": "s"}
+
+    tonight = get_observer_tonight()
+    rows = from_entries(DSO_CATALOG)
+    sites = [("configured site", tonight.lat, tonight.lon), ("60N", "60", "10"),
+             ("equator", "0", "-78.5"), ("45S", "-45", "170")]
+    failed = False
+    for label, lat, lon in sites:
+        obs = ephem.Observer()
+        obs.lat, obs.lon, obs.date = lat, lon, tonight.date
+        worst, flag_errors = _cross_check(obs, rows, DSO_CATALOG)
+        print(f"{label} ({math.degrees(float(obs.lat)):.1f}°), {len(DSO_CATALOG)} targets, max error vs ephem:")
+        for key, value in worst.items():
+            ok = value <= TOLERANCE[key]
+            failed |= not ok
+            unit = UNITS.get(key, '"')
+            print(f"  {key}: {value:.3f}{unit} (limit {TOLERANCE[key]}{unit}){'' if ok else '  FAIL'}")
+        failed |= flag_errors > 0
+        print(f"  circumpolar/never-up flags: {'match' if not flag_errors else f'{flag_errors} MISMATCH'}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,164 @@
+"""Spatial index over catalog unit vectors.
+
+Objects are bucketed into declination zones and sorted by RA inside each
+zone, so a cone search only touches the few zones and RA ranges that can
+overlap the cone instead of testing every object.
+"""
+
+import math
+import numpy as np
+
+DWARF3_FOV = (2.4, 1.8)  # degrees, width x height
+
+
+class SkyIndex:
+    """Zone index over a catalog array (see catalog.CATALOG_DTYPE).
+
+    Args:
+        catalog: catalog array with ra, dec and xyz columns
+        zone_height: declination zone height in degrees
+    """
+
+    def __init__(self, catalog: np.ndarray, zone_height: float = 1.0):
+        self.zone_height = zone_height
+        self.n_zones = int(math.ceil(180 / zone_height))
+
+        ra = np.asarray(catalog["ra"])
+        dec = np.asarray(catalog["dec"])
+        zone = self._zone(np.degrees(dec))
+
+        # Zone-major, RA-minor order for cone searches
+        self.order = np.lexsort((ra, zone))
+        self.ra = ra[self.order]
+        self.xyz = np.asarray(catalog["xyz"])[self.order]
+        self.zone_start = np.searchsorted(zone[self.order], np.arange(self.n_zones + 1))
+
+        # Declination order for "can it ever rise" queries
+        self.dec_order = np.argsort(dec)
+        self.dec_sorted = dec[self.dec_order]
+
+    def _zone(self, dec_deg):
+        return np.clip(((np.asarray(dec_deg) + 90) // self.zone_height).astype(int), 0, self.n_zones - 1)
+
+    def _ra_ranges(self, ra0: float, half_width: float) -> list:
+        """RA intervals (radians) covering ra0 +/- half_width, split at 0/2pi."""
+        if half_width >= math.pi:
+            return [(0.0, 2 * math.pi)]
+        lo, hi = ra0 - half_width, ra0 + half_width
+        if lo < 0:
+            return [(0.0, hi), (lo + 2 * math.pi, 2 * math.pi)]
+        if hi > 2 * math.pi:
+            return [(lo, 2 * math.pi), (0.0, hi - 2 * math.pi)]
+        return [(lo, hi)]
+
+    def cone(self, ra: float, dec: float, radius_deg: float) -> np.ndarray:
+        """Catalog indices of all objects within radius_deg of J2000 (ra, dec) radians."""
+        r = math.radians(radius_deg)
+        dec_deg = math.degrees(dec)
+        zones = range(int(self._zone(dec_deg - radius_deg)), int(self._zone(dec_deg + radius_deg)) + 1)
+
+        # RA half-width of the cone's widest point (Gray et al. zones algorithm)
+        if abs(dec) + r >= math.pi / 2:
+            half_width = math.pi
+        else:
+            half_width = math.atan(math.sin(r) / math.sqrt(abs(math.cos(dec - r) * math.cos(dec + r))))
+
+        candidates = []
+        for z in zones:
+            start, end = self.zone_start[z], self.zone_start[z + 1]
+            for lo, hi in self._ra_ranges(ra, half_width):
+                i0 = start + np.searchsorted(self.ra[start:end], lo, side="left")
+                i1 = start + np.searchsorted(self.ra[start:end], hi, side="right")
+                candidates.append(np.arange(i0, i1))
+        if not candidates:
+            return np.empty(0, dtype=int)
+
+        rows = np.unique(np.concatenate(candidates))
+        center = np.array([math.cos(dec) * math.cos(ra), math.cos(dec) * math.sin(ra), math.sin(dec)])
+        inside = self.xyz[rows] @ center >= math.cos(r)
+        return self.order[rows[inside]]
+
+    def ever_above(self, lat_deg: float, min_alt: float) -> np.ndarray:
+        """Catalog indices of objects whose transit altitude clears min_alt at this latitude.
+
+        Transit altitude is 90 - |lat - dec|, so this is a declination band.
+        """
+        reach = math.radians(90 - min_alt)
+        lat = math.radians(lat_deg)
+        lo = np.searchsorted(self.dec_sorted, lat - reach, side="left")
+        hi = np.searchsorted(self.dec_sorted, lat + reach, side="right")
+        return np.sort(self.dec_order[lo:hi])
+
+    def fields(self, fov: tuple[float, float] = DWARF3_FOV, indices=None) -> list:
+        """Group objects that fit together in one camera frame.
+
+        Greedy: each ungrouped object seeds a frame, then its neighbours
+        (nearest first) join while the group's extent on the tangent plane
+        still fits the field of view in either orientation.
+
+        Args:
+            fov: (width, height) of the frame in degrees
+            indices: optional subset of catalog indices to group
+
+        Returns:
+            List of catalog index arrays, one per frame holding 2+ objects
+        """
+        width, height = (math.radians(v) for v in sorted(fov, reverse=True))
+        radius = math.degrees(math.hypot(width, height))
+        xyz = self.xyz[np.argsort(self.order)]  # back to catalog order
+        pool = np.arange(len(xyz)) if indices is None else np.asarray(indices)
+        allowed = np.zeros(len(xyz), dtype=bool)
+        allowed[pool] = True
+        taken = np.zeros(len(xyz), dtype=bool)
+
+        groups = []
+        for seed in pool:
+            if taken[seed]:
+                continue
+            x, y, z = xyz[seed]
+            ra0, dec0 = math.atan2(y, x) % (2 * math.pi), math.asin(z)
+            near = self.cone(ra0, dec0, radius)
+            near = near[allowed[near] & ~taken[near] & (near != seed)]
+            if not len(near):
+                continue
+
+            # Gnomonic projection about the seed
+            east = np.array([-math.sin(ra0), math.cos(ra0), 0.0])
+            north = np.array([-math.sin(dec0) * math.cos(ra0), -math.sin(dec0) * math.sin(ra0), math.cos(dec0)])
+            depth = xyz[near] @ xyz[seed]
+            xi = (xyz[near] @ east) / depth
+            eta = (xyz[near] @ north) / depth
+
+            members = [seed]
+            box = [0.0, 0.0, 0.0, 0.0]  # xi min/max, eta min/max
+            for k in np.argsort(np.hypot(xi, eta)):
+                trial = [min(box[0], xi[k]), max(box[1], xi[k]), min(box[2], eta[k]), max(box[3], eta[k])]
+                span = sorted((trial[1] - trial[0], trial[3] - trial[2]), reverse=True)
+                if span[0] <= width and span[1] <= height:
+                    box = trial
+                    members.append(near[k])
+            if len(members) > 1:
+                taken[members] = True
+                groups.append(np.array(members))
+        return groups
+
+
+if __name__ == "__main__":
+    from targets import get_catalog
+    from config import LATITUDE, MIN_ALTITUDE
+    from night import get_night_context
+
+    catalog = get_catalog()
+    index = SkyIndex(catalog)
+    names = np.char.decode(catalog["name"], "utf-8")
+
+    reachable = index.ever_above(LATITUDE, MIN_ALTITUDE)
+    print(f"{len(reachable)}/{len(catalog)} objects can clear {MIN_ALTITUDE}° at latitude {LATITUDE}")
+
+    moon = get_night_context().moon
+    near_moon = index.cone(float(moon.a_ra), float(moon.a_dec), 30)
+    print(f"Within 30° of the Moon tonight: {', '.join(names[near_moon]) or 'none'}")
+
+    print("\nShared DWARF3 frames:")
+    for group in index.fields():
+        print(f"  {' + '.join(names[group])}")
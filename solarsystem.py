@@ -0,0 +1,308 @@
+"""Interpolated Sun, Moon and planet positions with a vectorized event solver.
+
+ephem computes one body at one instant, and next_rising/next_setting
+iterate separately for every body. `BodyCache` samples each body once at
+Chebyshev nodes over a date range and fits piecewise Chebyshev series to
+its topocentric apparent direction (as a unit vector, so RA never wraps),
+angular radius, the Moon's phase and the local sidereal time. Positions at
+any number of instants are then a few array operations, and `BodyCache.events`
+finds rise, set and twilight crossings for all bodies at once by bracketing
+sign changes on a time grid and bisecting every bracket together.
+
+Crossings use ephem's criterion: the body's upper limb on the horizon,
+with the horizon depressed by the observer's refraction, or the centre for
+twilight (pass use_center=True and pressure=0).
+"""
+
+import math
+import ephem
+import numpy as np
+import tracing
+from sky import horizontal, unit_vectors, unrefract
+
+BODIES = ("Sun", "Moon", "Venus", "Mars", "Jupiter", "Saturn")
+SEGMENT_DAYS = 0.5  # Moon's diurnal parallax needs short pieces
+DEGREE = 12  # errors stay below 0.01" for every body
+TWILIGHT = {"civil": -6.0, "nautical": -12.0, "astronomical": -18.0}
+
+# Channels per body: x, y, z of the direction, angular radius; the Moon adds phase
+_PER_BODY = 4
+
+
+def _nodes(degree: int) -> np.ndarray:
+    """Chebyshev points of the first kind on [-1, 1]."""
+    k = np.arange(degree + 1)
+    return np.cos(math.pi * (k + 0.5) / (degree + 1))
+
+
+def _clenshaw(coeffs: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Evaluate Chebyshev series coeffs (n, degree + 1, channels) at x (n,)."""
+    x2 = (2 * x)[:, None]
+    b1 = np.zeros((len(x), coeffs.shape[2]))
+    b2 = np.zeros_like(b1)
+    for k in range(coeffs.shape[1] - 1, 0, -1):
+        b1, b2 = x2 * b1 - b2 + coeffs[:, k], b1
+    return x[:, None] * b1 - b2 + coeffs[:, 0]
+
+
+class BodyCache:
+    """Piecewise Chebyshev fits of body positions for one observer and date range.
+
+    Args:
+        obs: site; its lat, lon, elevation, pressure and temperature are used
+        start, end: ephem dates the fits cover
+        bodies: names of ephem body classes
+    """
+
+    def __init__(self, obs: ephem.Observer, start: float, end: float, bodies=BODIES,
+                 segment: float = SEGMENT_DAYS, degree: int = DEGREE):
+        self.bodies = tuple(bodies)
+        self.index = {name: i for i, name in enumerate(self.bodies)}
+        self.lat = float(obs.lat)
+        self.pressure, self.temp = obs.pressure, obs.temp
+        self.start = float(start)
+        self.segment = segment
+        self.n_segments = max(1, math.ceil((float(end) - self.start) / segment))
+        self.end = self.start + self.n_segments * segment
+
+        site = ephem.Observer()
+        site.lat, site.lon, site.elevation = obs.lat, obs.lon, obs.elevation
+        site.pressure = 0
+        self._site = site  # geometric (unrefracted) altitudes for the solver
+
+        x = _nodes(degree)
+        times = self.start + (np.arange(self.n_segments)[:, None] + (x + 1) / 2) * segment
+        instances = [getattr(ephem, name)() for name in self.bodies]
+        n_channels = _PER_BODY * len(self.bodies) + 2  # + Moon phase + sidereal time
+        samples = np.empty((self.n_segments, degree + 1, n_channels))
+        for s in range(self.n_segments):
+            for k in range(degree + 1):
+                site.date = times[s, k]
+                row = samples[s, k]
+                for i, body in enumerate(instances):
+                    body.compute(site)
+                    ra, dec = float(body.ra), float(body.dec)
+                    row[_PER_BODY * i:_PER_BODY * (i + 1)] = (
+                        math.cos(dec) * math.cos(ra), math.cos(dec) * math.sin(ra), math.sin(dec),
+                        float(body.radius))
+                    if self.bodies[i] == "Moon":
+                        row[-2] = body.phase
+                row[-1] = float(site.sidereal_time())
+            samples[s, :, -1] = np.unwrap(samples[s, ::-1, -1])[::-1]  # nodes run backwards in time
+        tracing.count("ephem_calls", self.n_segments * (degree + 1) * len(self.bodies))
+
+        # Fit each segment: coefficients (segments, degree + 1, channels)
+        vander = np.polynomial.chebyshev.chebvander(x, degree)
+        self.coeffs = np.einsum("kj,sjc->skc", np.linalg.inv(vander), samples)
+
+    def _evaluate(self, times, channels=None) -> np.ndarray:
+        """Channels at the given ephem dates: shape (len(times), channels).
+
+        channels, if given, is a (len(times), k) index array picking k channels per time.
+        """
+        t = np.atleast_1d(np.asarray(times, dtype=float))
+        u = (t - self.start) / self.segment
+        if u.size and (u.min() < 0 or u.max() > self.n_segments):
+            raise ValueError("time outside the cached range")
+        seg = np.minimum(u.astype(np.intp), self.n_segments - 1)
+        coeffs = self.coeffs[seg]
+        if channels is not None:
+            coeffs = np.take_along_axis(coeffs, channels[:, None, :], axis=2)
+        return _clenshaw(coeffs, 2 * (u - seg) - 1)
+
+    def _slice(self, values: np.ndarray, name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        i = _PER_BODY * self.index[name]
+        x, y, z, radius = (values[:, i + j] for j in range(_PER_BODY))
+        ra = np.mod(np.arctan2(y, x), 2 * math.pi)
+        dec = np.arctan2(z, np.hypot(x, y))
+        return ra, dec, radius
+
+    def radec(self, name: str, times) -> tuple[np.ndarray, np.ndarray]:
+        """Topocentric apparent RA/Dec (radians) of a body at ephem dates."""
+        ra, dec, _ = self._slice(self._evaluate(times), name)
+        return ra, dec
+
+    def sidereal_time(self, times) -> np.ndarray:
+        """Local apparent sidereal time (radians)."""
+        return np.mod(self._evaluate(times)[:, -1], 2 * math.pi)
+
+    def moon_phase(self, times) -> np.ndarray:
+        """Percent of the Moon's disc illuminated."""
+        return self._evaluate(times)[:, -2]
+
+    def positions(self, times, names=None) -> dict:
+        """Altitude, azimuth (degrees, refracted like ephem), RA/Dec and radius per body.
+
+        Returns:
+            dict of name -> {"ra", "dec", "altitude", "azimuth", "radius"}, arrays over times
+        """
+        values = self._evaluate(times)
+        lst = np.mod(values[:, -1], 2 * math.pi)
+        site = self._site.copy()
+        site.pressure, site.temp = self.pressure, self.temp
+        result = {}
+        for name in names or self.bodies:
+            ra, dec, radius = self._slice(values, name)
+            alt, az = horizontal(site, ra, dec, lst)
+            result[name] = {"ra": ra, "dec": dec, "altitude": np.degrees(alt),
+                            "azimuth": np.degrees(az), "radius": radius}
+        return result
+
+    def _height(self, body_idx: np.ndarray, times: np.ndarray, horizon: float,
+                use_center: bool, pressure: float) -> np.ndarray:
+        """Geometric altitude minus the crossing altitude, per (body, time) pair."""
+        channels = np.empty((len(body_idx), _PER_BODY + 1), dtype=np.intp)
+        channels[:, :_PER_BODY] = _PER_BODY * body_idx[:, None] + np.arange(_PER_BODY)
+        channels[:, -1] = self.coeffs.shape[2] - 1  # sidereal time
+        x, y, z, radius, lst = self._evaluate(times, channels).T
+        ra = np.arctan2(y, x)
+        dec = np.arctan2(z, np.hypot(x, y))
+        alt, _ = horizontal(self._site, ra, dec, lst)
+        target = horizon - (0.0 if use_center else radius)
+        if pressure:
+            target = unrefract(pressure, self.temp, target)
+        return alt - target
+
+    def events(self, start: float, end: float, names=None, horizon: float = 0.0,
+               use_center: bool = False, pressure: float | None = None,
+               step_minutes: float = 10, iterations: int = 20) -> dict:
+        """Every rise and set between start and end, solved for all bodies together.
+
+        Args:
+            start, end: ephem dates to search
+            horizon: crossing altitude in degrees
+            use_center: cross with the centre rather than the upper limb
+            pressure: refraction pressure (default: the observer's; 0 for twilight)
+            step_minutes: grid spacing; events closer together than this can be missed
+
+        Returns:
+            dict of name -> {"rise": [dates], "set": [dates], "up": above at start}
+        """
+        names = tuple(names or self.bodies)
+        pressure = self.pressure if pressure is None else pressure
+        horizon = math.radians(horizon)
+        step = step_minutes * ephem.minute
+        grid = np.linspace(start, end, max(2, math.ceil((end - start) / step) + 1))
+        idx = np.array([self.index[n] for n in names])
+
+        body_idx = np.repeat(idx, len(grid))
+        heights = self._height(body_idx, np.tile(grid, len(idx)), horizon, use_center, pressure)
+        up = (heights >= 0).reshape(len(idx), len(grid))
+        which, k = np.nonzero(up[:, :-1] != up[:, 1:])
+        rising = ~up[which, k]
+
+        # Bisect every bracket at once
+        lo, hi = grid[k], grid[k + 1]
+        body_idx = idx[which]
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            above = self._height(body_idx, mid, horizon, use_center, pressure) >= 0
+            move_hi = above == rising
+            hi = np.where(move_hi, mid, hi)
+            lo = np.where(move_hi, lo, mid)
+        found = (lo + hi) / 2
+
+        result = {name: {"rise": [], "set": [], "up": bool(up[i, 0])} for i, name in enumerate(names)}
+        for w, when, is_rise in zip(which, found, rising):
+            result[names[w]]["rise" if is_rise else "set"].append(ephem.Date(when))
+        return result
+
+    def next_event(self, name: str, kind: str, start: float, horizon: float = 0.0,
+                   use_center: bool = False, pressure: float | None = None) -> ephem.Date:
+        """First rise or set after start within the cache; raises like ephem if there is none."""
+        found = self.events(start, self.end, (name,), horizon, use_center, pressure)[name]
+        if found[kind]:
+            return found[kind][0]
+        up = found["up"]
+        if not found["rise" if kind == "set" else "set"] and self.end - start >= 1:
+            raise (ephem.AlwaysUpError if up else ephem.NeverUpError)(
+                f"{name} is {'always above' if up else 'never above'} the horizon")
+        raise ValueError(f"no {name} {kind} before the end of the cached range")
+
+    def twilight(self, start: float, end: float, depth: str | float = "astronomical") -> dict:
+        """Sun crossings of a twilight altitude: {"dusk": [dates], "dawn": [dates]}."""
+        altitude = TWILIGHT.get(depth, depth)
+        found = self.events(start, end, ("Sun",), float(altitude), use_center=True, pressure=0)["Sun"]
+        return {"dusk": found["set"], "dawn": found["rise"]}
+
+    def moon_separation(self, name: str, times) -> np.ndarray:
+        """Angular distance (degrees) between a body and the Moon."""
+        values = self._evaluate(times)
+        ra, dec, _ = self._slice(values, name)
+        moon_ra, moon_dec, _ = self._slice(values, "Moon")
+        dot = np.sum(unit_vectors(ra, dec) * unit_vectors(moon_ra, moon_dec), axis=0)
+        return np.degrees(np.arccos(np.clip(dot, -1.0, 1.0)))
+
+
+def _limb_altitude(obs: ephem.Observer, name: str, when) -> float:
+    """ephem's apparent altitude of the body's upper limb (radians) at an instant."""
+    obs = obs.copy()
+    obs.date = when
+    body = getattr(ephem, name)()
+    body.compute(obs)
+    return float(body.alt) + float(body.radius)
+
+
+if __name__ == "__main__":
+    # Cross-check against ephem for a few nights and sites; exits 1 if anything is out of tolerance
+    import sys
+    import time
+
+    POSITION_TOLERANCE = 0.1  # arcsec of altitude
+    EVENT_TOLERANCE = 1.0  # seconds
+
+    began = time.perf_counter()
+    worst_pos = worst_event = 0.0
+    failures = []
+    for lat, lon in ((28.2336, -82.1812), (51.5, -0.1), (-33.9, 18.4), (69.6, 18.9)):
+        for offset in range(0, 360, 45):
+            obs = ephem.Observer()
+            obs.lat, obs.lon = str(lat), str(lon)
+            start = ephem.Date(ephem.Date("2025/1/1") + offset)
+            cache = BodyCache(obs, start, start + 2)
+            dates = np.linspace(float(start), float(start) + 2, 25)
+            pos = cache.positions(dates)
+            for name in BODIES:
+                body = getattr(ephem, name)()
+                for i, d in enumerate(dates):
+                    obs.date = d
+                    body.compute(obs)
+                    err = abs(pos[name]["altitude"][i] - math.degrees(body.alt)) * 3600
+                    worst_pos = max(worst_pos, err)
+                obs.date = start
+                for kind, method in (("rise", "next_rising"), ("set", "next_setting")):
+                    try:
+                        expected = getattr(obs, method)(body)
+                    except (ephem.AlwaysUpError, ephem.NeverUpError) as e:
+                        expected = type(e)
+                    try:
+                        got = cache.next_event(name, kind, start)
+                    except (ephem.AlwaysUpError, ephem.NeverUpError) as e:
+                        got = type(e)
+                    except ValueError:
+                        continue  # beyond the cached range
+                    where = f"{lat:+.1f} {name} {kind} {start}"
+                    if isinstance(got, type):
+                        if expected != got:
+                            failures.append(f"{where}: ephem {expected}, cache {got.__name__}")
+                    elif isinstance(expected, type):
+                        # ephem gives up when the body cannot cross at today's declination;
+                        # the grid search still finds a crossing after it drifts. Accept it
+                        # only if ephem agrees the limb crosses the horizon there, in that direction.
+                        before = _limb_altitude(obs, name, got - ephem.minute)
+                        after = _limb_altitude(obs, name, got + ephem.minute)
+                        at = abs(math.degrees(_limb_altitude(obs, name, got))) * 3600
+                        rising = after > before
+                        if at > 10 or rising != (kind == "rise"):
+                            failures.append(f"{where}: ephem {expected.__name__}, cache {got} is not a {kind}")
+                    else:
+                        worst_event = max(worst_event, abs(got - expected) / ephem.second)
+    if worst_pos > POSITION_TOLERANCE:
+        failures.append(f"altitude error {worst_pos:.3f}\" over {POSITION_TOLERANCE}\"")
+    if worst_event > EVENT_TOLERANCE:
+        failures.append(f"event error {worst_event:.2f}s over {EVENT_TOLERANCE}s")
+    print(f"Worst altitude error {worst_pos:.3f}\", worst event error {worst_event:.2f}s "
+          f"({time.perf_counter() - began:.1f}s)")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
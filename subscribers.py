@@ -0,0 +1,194 @@
+"""Club mode: one run serving many members, each with their own site and taste.
+
+The registry (SUBSCRIBERS_FILE) is a JSON list of members:
+
+    [{"name": "dana", "lat": 28.26, "lon": -82.14, "topic": "clearskies-dana",
+      "min_target_score": 7, "min_conditions_score": 6, "top": 5,
+      "types": ["galaxy"], "difficulties": ["easy", "medium"], "targets": null}]
+
+Only name, lat, lon and topic are required; thresholds default to config.py,
+and types/difficulties/targets (names) restrict the catalog when set.
+
+Members are grouped by location rounded to SUBSCRIBER_GRID_DEG. Forecasts for
+all groups come from batched Open-Meteo requests. Each group's night, moon
+and catalog scoring run once, in a process pool across cores. Each member
+then gets their own target filter, thresholds and message, and all messages
+go out in one fan-out.
+
+    python subscribers.py --file subscribers.json [--workers 8] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import tracing
+from config import (
+    BATCH_WORKERS, MIN_CONDITIONS_SCORE, MIN_TARGET_SCORE, SUBSCRIBER_GRID_DEG, SUBSCRIBERS_FILE,
+    TOP_TARGETS_COUNT, VISIBILITY_MODE,
+)
+from main import assess_conditions, decide, ensemble_check
+from moon import get_moon_info
+from night import NightContext
+from weather import fetch_forecasts, viewing_row
+
+REQUIRED_FIELDS = ("name", "lat", "lon", "topic")
+DEFAULTS = {
+    "min_target_score": MIN_TARGET_SCORE,
+    "min_conditions_score": MIN_CONDITIONS_SCORE,
+    "top": TOP_TARGETS_COUNT,
+    "types": None,
+    "difficulties": None,
+    "targets": None,
+}
+
+
+def load_subscribers(path: str = SUBSCRIBERS_FILE) -> list:
+    """Members from the registry, with defaults filled in.
+
+    Raises:
+        ValueError if a member lacks a required field
+    """
+    with open(path) as f:
+        members = json.load(f)
+    subscribers = []
+    for i, member in enumerate(members):
+        missing = [k for k in REQUIRED_FIELDS if k not in member]
+        if missing:
+            raise ValueError(f"{path}: member {i} is missing {', '.join(missing)}")
+        subscribers.append({**DEFAULTS, **member})
+    return subscribers
+
+
+def group_key(subscriber: dict, grid: float = SUBSCRIBER_GRID_DEG) -> tuple[float, float]:
+    """Rounded location shared by nearby members."""
+    return (round(round(subscriber["lat"] / grid) * grid, 4), round(round(subscriber["lon"] / grid) * grid, 4))
+
+
+def evaluate_group(lat: float, lon: float, night: date | None, hourly: dict | None,
+                   min_conditions_score: int, mode: str = VISIBILITY_MODE) -> dict:
+    """Night, moon, weather and scored catalog for one group (runs in a worker process).
+
+    The catalog is only scored, and the ensemble (if enabled) only fetched,
+    if the conditions could pass for the most lenient member of the group.
+    """
+    ctx = NightContext(lat, lon, night)
+    moon = get_moon_info(ctx)
+    group = {"evening": ctx.evening, "weather": None, "moon": moon, "targets": None, "ensemble": None}
+    if hourly is None:
+        return group
+    group["weather"] = viewing_row(hourly, ctx)
+    if group["weather"] is None:
+        return group
+    score, _ = assess_conditions(group["weather"], moon)
+    if score >= min_conditions_score:
+        from targets import get_recommendations  # Deferred like main.py: cloudy groups skip numpy
+        targets = get_recommendations(mode, ctx=ctx)
+        group["targets"] = targets[targets["score"] > 0]  # Columns pickle compactly back to the parent
+        ensemble = ensemble_check(ctx)
+        if ensemble:
+            group["ensemble"] = ensemble()
+    return group
+
+
+def wants(subscriber: dict, target: dict) -> bool:
+    """Whether a target is in the member's catalog subset."""
+    return ((subscriber["types"] is None or target["type"] in subscriber["types"])
+            and (subscriber["difficulties"] is None or target["difficulty"] in subscriber["difficulties"])
+            and (subscriber["targets"] is None or target["name"] in subscriber["targets"]))
+
+
+def personalize(subscriber: dict, group: dict) -> dict | None:
+    """The member's decision (see main.decide), or None without a forecast."""
+    if group["weather"] is None:
+        return None
+    targets = [t for t in group["targets"] or [] if wants(subscriber, t)]
+    return decide(group["weather"], group["moon"], targets, subscriber["min_conditions_score"],
+                  subscriber["min_target_score"], subscriber["top"], ensemble=group["ensemble"])
+
+
+def run_batch(subscribers: list, night: date | None = None, workers: int | None = BATCH_WORKERS,
+              send: bool = True) -> list:
+    """Evaluate every group once, then decide and notify per member.
+
+    Args:
+        night: local date of the evening (default: tonight)
+        workers: processes for group evaluation (default: all cores; 1 runs inline)
+        send: deliver notifications (False for a dry run)
+
+    Returns:
+        One report per member: name, topic, group, decision and delivery status
+    """
+    groups = {}
+    for subscriber in subscribers:
+        groups.setdefault(group_key(subscriber), []).append(subscriber)
+    keys = list(groups)
+    tracing.gauge("subscriber_groups", len(keys))
+
+    with tracing.span("batch.forecasts", sites=len(keys)):
+        forecasts = fetch_forecasts(keys)
+
+    jobs = [(lat, lon, night, data["hourly"] if data else None,
+             min(s["min_conditions_score"] for s in groups[(lat, lon)]))
+            for (lat, lon), data in zip(keys, forecasts)]
+    with tracing.span("batch.groups", groups=len(jobs), workers=workers or 0):
+        if workers == 1 or len(jobs) <= 1:
+            results = [evaluate_group(*job) for job in jobs]
+        else:
+            chunk = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(evaluate_group, *zip(*jobs), chunksize=chunk))
+
+    reports, messages = [], []
+    for key, group in zip(keys, results):
+        for subscriber in groups[key]:
+            decision = personalize(subscriber, group)
+            report = {"name": subscriber["name"], "topic": subscriber["topic"], "group": key,
+                      "decision": decision, "delivery": None}
+            reports.append(report)
+            if decision and decision["notify"]:
+                messages.append((report, group["evening"], {
+                    "topic": subscriber["topic"], "title": decision["title"],
+                    "message": decision["message"], "priority": decision["priority"]}))
+
+    if send and messages:
+        from notifier import deliver_many  # Deferred with its HTTP stack until there is news to send
+        # Dedupe is scoped per night; groups far apart in longitude can disagree on the date
+        by_night = {}
+        for report, evening, message in messages:
+            by_night.setdefault(evening, []).append((report, message))
+        with tracing.span("batch.notify", messages=len(messages)):
+            for evening, batch in by_night.items():
+                for (report, _), status in zip(batch, deliver_many([m for _, m in batch], night=evening)):
+                    report["delivery"] = status
+    return reports
+
+
+if __name__ == "__main__":
+    import time
+    from config import METRICS_TEXTFILE, TRACE_JSONL
+
+    parser = argparse.ArgumentParser(description="Run the nightly check for every member in the registry.")
+    parser.add_argument("--file", default=SUBSCRIBERS_FILE, help="subscriber registry (JSON)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="worker processes")
+    parser.add_argument("--night", type=date.fromisoformat, help="evening to evaluate (default: tonight)")
+    parser.add_argument("--dry-run", action="store_true", help="decide but don't send")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    subscribers = load_subscribers(args.file)
+    reports = run_batch(subscribers, args.night, args.workers, send=not args.dry_run)
+    groups = len({r["group"] for r in reports})
+    print(f"{len(reports)} members in {groups} groups, {time.perf_counter() - start:.2f}s\n")
+    for r in reports:
+        d = r["decision"]
+        if d is None:
+            outcome = "no forecast"
+        elif d["notify"]:
+            outcome = f"notify [{d['conditions_score']}/10] {', '.join(d['targets'][:3])}"
+            outcome += f" ({r['delivery']})" if r["delivery"] else " (dry run)"
+        else:
+            outcome = d["reason"]
+        print(f"{r['name']:<16} {r['topic']:<24} {outcome}")
+    tracing.export(TRACE_JSONL, METRICS_TEXTFILE)
@@ -2,17 +2,24 @@
 
 import ephem
 import math
-import pytz
-from datetime import datetime, timezone
-from config import LATITUDE, LONGITUDE, TIMEZONE
-
-LOCAL_TZ = pytz.timezone(TIMEZONE)
-
-
-def ephem_to_local(ephem_date) -> datetime:
-    """Convert ephem date to local timezone datetime."""
-    utc_dt = ephem.Date(ephem_date).datetime().replace(tzinfo=pytz.UTC)
-    return utc_dt.astimezone(LOCAL_TZ)
+import numpy as np
+import tracing
+from functools import lru_cache
+from catalog import DIFFICULTY_NAMES, TYPE_NAMES, from_entries, load_catalog
+from config import (
+    VISIBILITY_MODE, GRID_STEP_MINUTES, MIN_ALTITUDE, MIN_IMAGING_HOURS, CATALOG_PATH, HORIZON_FILE,
+    EPHEMERIS_DIR,
+)
+from ephemtable import EphemerisTable, fingerprint, open_table
+from horizon import load_horizon
+from night import NightContext, ephem_to_local, get_night_context
+from results import TargetTable, round_exact, write_csv, write_jsonl
+from sky import compute_catalog, time_grid, visibility_grid
+from scoring import target_score_array
+from skyindex import SkyIndex
+
+CULL_MARGIN = 1.0  # degrees of slack when culling by J2000 declination
+PLANETS = ("Venus", "Mars", "Jupiter", "Saturn")
 
 # DWARF3-optimized catalog (150mm f/6.3, ~2.4° x 1.8° FOV)
 # Organized by season (when best visible in evening)
@@ -118,23 +125,66 @@ DSO_CATALOG = [
 ]
 
 
-def get_observer_tonight() -> ephem.Observer:
-    """Create an observer for tonight's prime viewing time (2 hrs after sunset)."""
-    obs = ephem.Observer()
-    obs.lat = str(LATITUDE)
-    obs.lon = str(LONGITUDE)
-    obs.date = datetime.now(timezone.utc)
+@lru_cache(maxsize=1)
+def get_catalog() -> np.ndarray:
+    """Active target catalog: CATALOG_PATH if set, else the built-in list."""
+    if CATALOG_PATH:
+        return load_catalog(CATALOG_PATH)
+    return from_entries(DSO_CATALOG)
 
-    # Get next sunset
-    sun = ephem.Sun()
-    try:
-        next_sunset = obs.next_setting(sun)
-    except ephem.AlwaysUpError:
-        next_sunset = obs.date
 
-    # Set time to 2 hours after sunset (astronomical darkness)
-    obs.date = ephem.Date(next_sunset + 2 * ephem.hour)
-    return obs
+@lru_cache(maxsize=1)
+def get_sky_index() -> SkyIndex:
+    """Spatial index over the active catalog."""
+    return SkyIndex(get_catalog())
+
+
+@lru_cache(maxsize=1)
+def get_horizon() -> np.ndarray | None:
+    """Per-azimuth altitude limits from HORIZON_FILE (None for a flat MIN_ALTITUDE)."""
+    return load_horizon(HORIZON_FILE, min_alt=MIN_ALTITUDE) if HORIZON_FILE else None
+
+
+@lru_cache(maxsize=1)
+def catalog_fingerprint() -> str:
+    """Hash of the active catalog, to tell whether a precomputed table is current."""
+    return fingerprint(get_catalog())
+
+
+@lru_cache(maxsize=8)
+def get_ephemeris_table(lat: float, lon: float) -> EphemerisTable | None:
+    """Precomputed table for the site if one exists and matches the current settings."""
+    table = open_table(EPHEMERIS_DIR, lat, lon)
+    if table and table.matches(MIN_ALTITUDE, GRID_STEP_MINUTES, get_horizon(), catalog_fingerprint()):
+        return table
+    return None
+
+
+def _table_row(ctx: NightContext, catalog: np.ndarray | None) -> tuple[EphemerisTable | None, int | None]:
+    """(table, row) for ctx's night when the active catalog's table covers it."""
+    if catalog is not None:
+        return None, None
+    table = get_ephemeris_table(ctx.lat, ctx.lon)
+    row = table.row(ctx) if table else None
+    return (table, row) if row is not None else (None, None)
+
+
+def get_candidates(lat: float, catalog: np.ndarray | None = None, min_alt: float = MIN_ALTITUDE) -> np.ndarray:
+    """Catalog rows that can ever climb above min_alt at this latitude.
+
+    Uses the active catalog unless another catalog array is given.
+    """
+    if catalog is None:
+        catalog, index = get_catalog(), get_sky_index()
+    else:
+        index = SkyIndex(catalog)
+    return catalog[index.ever_above(lat, min_alt - CULL_MARGIN)]
+
+
+def get_observer_tonight(ctx: NightContext | None = None) -> ephem.Observer:
+    """Create an observer for tonight's prime viewing time (2 hrs after sunset)."""
+    ctx = ctx or get_night_context()
+    return ctx.observer()
 
 
 def angular_separation(ra1, dec1, ra2, dec2) -> float:
@@ -187,24 +237,21 @@ def get_target_info(obs: ephem.Observer, name: str, ra: str, dec: str,
 
 
 def get_planets(obs: ephem.Observer, moon: ephem.Moon) -> list:
-    """Get planet positions."""
-    planets = [
-        ("Venus", ephem.Venus(obs)),
-        ("Mars", ephem.Mars(obs)),
-        ("Jupiter", ephem.Jupiter(obs)),
-        ("Saturn", ephem.Saturn(obs)),
-    ]
+    """Get planet positions (see get_night_planets for the whole dark window)."""
+    moon_ra, moon_dec = float(moon.ra), float(moon.dec)
+    planets = []
+    for name in PLANETS:
+        planet = getattr(ephem, name)(obs)
+        planets.append((name, {"ra": float(planet.ra), "dec": float(planet.dec),
+                               "altitude": float(planet.alt) * 180 / math.pi,
+                               "azimuth": float(planet.az) * 180 / math.pi}))
 
     results = []
     for name, planet in planets:
-        altitude = float(planet.alt) * 180 / math.pi
-        azimuth = float(planet.az) * 180 / math.pi
-
-        moon_ra = float(moon.ra) * 12 / math.pi
-        moon_dec = float(moon.dec) * 180 / math.pi
-        planet_ra = float(planet.ra) * 12 / math.pi
-        planet_dec = float(planet.dec) * 180 / math.pi
-        moon_sep = angular_separation(planet_ra, planet_dec, moon_ra, moon_dec)
+        altitude = float(planet["altitude"])
+        azimuth = float(planet["azimuth"])
+        moon_sep = angular_separation(float(planet["ra"]) * 12 / math.pi, float(planet["dec"]) * 180 / math.pi,
+                                      moon_ra * 12 / math.pi, moon_dec * 180 / math.pi)
 
         results.append({
             "name": name,
@@ -219,89 +266,233 @@ def get_planets(obs: ephem.Observer, moon: ephem.Moon) -> list:
     return results
 
 
-def get_recommendations() -> list:
-    """Get ranked list of targets for tonight.
+def get_night_planets(ctx: NightContext | None = None, step_minutes: int = GRID_STEP_MINUTES) -> list:
+    """Planets over tonight's dark window, from the night's interpolated positions.
+
+    Every planet is evaluated on the same time grid as night mode in one
+    array pass, and rises/sets inside the window are solved together.
 
     Returns:
-        List of targets sorted by score (best first)
+        List of planet dicts (best altitude in the window, hours above 10°,
+        rise/set inside the window or None), highest first
     """
-    obs = get_observer_tonight()
-    moon = ephem.Moon(obs)
-    moon_phase = moon.phase
+    ctx = ctx or get_night_context()
+    start, end = ctx.window
+    dates = time_grid(start, end, step_minutes)
+    bodies = ctx.bodies
+    positions = bodies.positions(dates, PLANETS)
+    events = bodies.events(float(start), float(end), PLANETS)
+
+    results = []
+    for name in PLANETS:
+        altitude = positions[name]["altitude"]
+        best = int(np.argmax(altitude))
+        hours_up = int(np.count_nonzero(altitude > 10)) * step_minutes / 60
+        rise, set_ = events[name]["rise"], events[name]["set"]
+        results.append({
+            "name": name,
+            "type": "planet",
+            "difficulty": "easy",
+            "altitude": round(float(altitude[best]), 1),
+            "azimuth": round(float(positions[name]["azimuth"][best]), 1),
+            "moon_separation": round(float(bodies.moon_separation(name, dates[best:best + 1])[0]), 1),
+            "visible": hours_up > 0,
+            "hours_up": round(hours_up, 1),
+            "transit_time": ephem_to_local(dates[best]).strftime("%-I:%M %p"),
+            "rise": ephem_to_local(rise[0]).strftime("%-I:%M %p") if rise else None,
+            "set": ephem_to_local(set_[0]).strftime("%-I:%M %p") if set_ else None,
+        })
+    results.sort(key=lambda p: p["altitude"], reverse=True)
+    return results
+
+
+def get_night_recommendations(step_minutes: int = GRID_STEP_MINUTES,
+                              ctx: NightContext | None = None,
+                              catalog: np.ndarray | None = None) -> TargetTable:
+    """Get ranked targets scored over tonight's whole dark window (see _night_table)."""
+    return _night_table(step_minutes, ctx, catalog).ranked()
+
+
+def _night_table(step_minutes: int = GRID_STEP_MINUTES, ctx: NightContext | None = None,
+                 catalog: np.ndarray | None = None) -> TargetTable:
+    """Targets scored over tonight's whole dark window, in catalog order.
+
+    Every target is evaluated on a time grid from dusk to dawn. Altitude
+    points come from the best altitude in the window, scaled down for
+    targets up for less than MIN_IMAGING_HOURS.
+
+    Returns:
+        TargetTable with hours_up; transit is the time of best altitude in the window
+    """
+    ctx = ctx or get_night_context()
+    dates = time_grid(*ctx.window, step_minutes)
+
+    obs = ctx.observer()
+    moon_phase = ctx.moon.phase
+    table, night_row = _table_row(ctx, catalog) if step_minutes == GRID_STEP_MINUTES else (None, None)
+    if table:
+        # Precomputed night: just index the table
+        catalog, grid = table.catalog, table.grid(night_row)
+        tracing.gauge("catalog_size", len(catalog))
+    else:
+        horizon = get_horizon()
+        catalog = get_candidates(ctx.lat, catalog, MIN_ALTITUDE if horizon is None else horizon.min())
+        tracing.gauge("catalog_size", len(catalog))
+        with tracing.span("visibility_grid", objects=len(catalog), steps=len(dates)):
+            grid = visibility_grid(obs, catalog["ra"], catalog["dec"], dates, MIN_ALTITUDE, horizon=horizon)
+
+    # Drop targets that only ever rise behind the local horizon
+    masked = (grid["steps_up"] == 0) & (grid["steps_blocked"] > 0)
+    if masked.any():
+        catalog = catalog[~masked]
+        grid = {k: v[~masked] for k, v in grid.items()}
+    hours_up = grid["steps_up"] * step_minutes / 60
+
+    altitude = round_exact(grid["best_altitude"])
+    moon_separation = round_exact(grid["moon_separation"])
+    difficulty = DIFFICULTY_NAMES[catalog["difficulty"]]
+    visible = hours_up > 0
+    with tracing.span("scoring", targets=len(altitude)):
+        scores = target_score_array(altitude, moon_separation, moon_phase, difficulty,
+                                    alt_weight=np.minimum(1.0, hours_up / MIN_IMAGING_HOURS))
+
+    return TargetTable(
+        name=np.char.decode(catalog["name"], "utf-8"),
+        type=TYPE_NAMES[catalog["type"]],
+        difficulty=difficulty,
+        altitude=altitude,
+        azimuth=round_exact(grid["best_azimuth"]),
+        moon_separation=moon_separation,
+        visible=visible,
+        hours_up=round_exact(hours_up),
+        transit=np.asarray(grid["best_time"], dtype=float),
+        score=np.where(visible, round_exact(scores), 0.0),
+    )
+
+
+def get_recommendations(mode: str = VISIBILITY_MODE, ctx: NightContext | None = None,
+                        catalog: np.ndarray | None = None) -> TargetTable:
+    """Get ranked targets for tonight.
+
+    Args:
+        mode: "snapshot" (sunset+2h) or "night" (whole dark window)
+        ctx: shared night context (default: tonight at the configured site)
+        catalog: catalog array to evaluate (default: the active catalog)
+
+    Returns:
+        TargetTable sorted by score (best first); its rows read like dicts
+        (name, type, difficulty, altitude, azimuth, moon_separation,
+        visible, transit_time, score)
+    """
+    return score_targets(mode, ctx, catalog).ranked()
+
+
+def get_top_targets(k: int, mode: str = VISIBILITY_MODE, ctx: NightContext | None = None,
+                    catalog: np.ndarray | None = None, types=None, difficulties=None,
+                    min_score: float | None = None) -> TargetTable:
+    """The k best targets passing the filters, without ranking the rest.
+
+    Same rows and order as the first k of get_recommendations after filtering.
+    """
+    return score_targets(mode, ctx, catalog).top(k, types, difficulties, min_score)
+
+
+def iter_recommendations(mode: str = VISIBILITY_MODE, ctx: NightContext | None = None,
+                         catalog: np.ndarray | None = None, chunk: int = 4096, **filters):
+    """Yield targets best first, ranking one chunk at a time (filters as for get_top_targets)."""
+    yield from score_targets(mode, ctx, catalog).iter_ranked(chunk, **filters)
+
+
+def export_recommendations(path: str, fmt: str | None = None, mode: str = VISIBILITY_MODE,
+                           ctx: NightContext | None = None, catalog: np.ndarray | None = None,
+                           **filters) -> int:
+    """Stream the full ranked list to a JSONL or CSV file (format from the extension by default).
+
+    Rows are written as they are ranked, so the list is never built in memory.
+
+    Returns:
+        Number of targets written
+    """
+    fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+    write = {"jsonl": write_jsonl, "csv": write_csv}[fmt]
+    with open(path, "w", newline="") as f:
+        return write(iter_recommendations(mode, ctx, catalog, **filters), f)
+
 
-    targets = []
+def score_targets(mode: str = VISIBILITY_MODE, ctx: NightContext | None = None,
+                  catalog: np.ndarray | None = None) -> TargetTable:
+    """Scored targets for tonight in catalog order (see get_recommendations for the arguments)."""
+    ctx = ctx or get_night_context()
+    if mode == "night":
+        return _night_table(ctx=ctx, catalog=catalog)
+
+    obs = ctx.observer()
+    moon = ctx.moon
+    moon_phase = moon.phase
 
     # Add DSOs (planets skipped - too small for DWARF3's wide field)
-    for name, ra, dec, obj_type, difficulty in DSO_CATALOG:
-        info = get_target_info(obs, name, ra, dec, obj_type, difficulty, moon)
-        targets.append(info)
-
-    # Score each target on 1-10 scale
-    for t in targets:
-        if not t["visible"]:
-            t["score"] = 0
-            continue
-
-        # Altitude score (0-3 points): 30-70° is optimal
-        alt = t["altitude"]
-        if alt >= 30 and alt <= 70:
-            alt_score = 3.0
-        elif alt >= 20 and alt < 30:
-            alt_score = 2.0
-        elif alt > 70:
-            alt_score = 2.5  # High is okay, just more atmosphere at horizon
-        else:
-            alt_score = 1.0
-
-        # Moon separation score (0-3 points): farther is better
-        sep = t["moon_separation"]
-        if sep >= 90:
-            moon_sep_score = 3.0
-        elif sep >= 60:
-            moon_sep_score = 2.0
-        elif sep >= 30:
-            moon_sep_score = 1.0
-        else:
-            moon_sep_score = 0.5
-
-        # Moon phase penalty (0-2 points): darker is better
-        if moon_phase < 25:
-            moon_phase_score = 2.0
-        elif moon_phase < 50:
-            moon_phase_score = 1.5
-        elif moon_phase < 75:
-            moon_phase_score = 1.0
-        else:
-            moon_phase_score = 0.5
-
-        # Difficulty score (0-2 points): easier = higher
-        diff_scores = {"easy": 2.0, "medium": 1.5, "hard": 1.0}
-        diff_score = diff_scores.get(t["difficulty"], 1.0)
-
-        # Total: max 10 points
-        total = alt_score + moon_sep_score + moon_phase_score + diff_score
-        t["score"] = round(total, 1)
-
-    # Sort by score descending
-    targets.sort(key=lambda x: x["score"], reverse=True)
-
-    return targets
+    table, night_row = _table_row(ctx, catalog)
+    if table:
+        # Precomputed night: just index the table
+        tracing.gauge("catalog_size", len(table.catalog))
+        batch = table.snapshot(night_row)
+    else:
+        horizon = get_horizon()
+        candidates = get_candidates(ctx.lat, catalog, MIN_ALTITUDE if horizon is None else horizon.min())
+        tracing.gauge("catalog_size", len(candidates))
+        with tracing.span("compute_catalog", objects=len(candidates)):
+            batch = compute_catalog(obs, candidates, moon, min_alt=MIN_ALTITUDE, horizon=horizon)
+
+    # Drop targets hidden behind the local horizon before scoring
+    if batch["masked"].any():
+        batch = {k: v[~batch["masked"]] for k, v in batch.items()}
+    altitude = round_exact(batch["altitude"])
+    moon_separation = round_exact(batch["moon_separation"])
+
+    # Score each target on 1-10 scale, all at once
+    with tracing.span("scoring", targets=len(altitude)):
+        scores = target_score_array(altitude, moon_separation, moon_phase, batch["difficulty"])
+        return TargetTable(
+            name=batch["name"],
+            type=batch["type"],
+            difficulty=batch["difficulty"],
+            altitude=altitude,
+            azimuth=round_exact(batch["azimuth"]),
+            moon_separation=moon_separation,
+            visible=np.asarray(batch["visible"], dtype=bool),
+            transit=np.asarray(batch["transit"], dtype=float),
+            score=np.where(batch["visible"], round_exact(scores), 0.0),
+        )
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tonight's top targets.")
+    parser.add_argument("--top", type=int, default=5, help="targets to list")
+    parser.add_argument("--type", action="append", help="only this type (repeatable)")
+    parser.add_argument("--difficulty", action="append", help="only this difficulty (repeatable)")
+    parser.add_argument("--min-score", type=float, default=6, help="minimum score")
+    parser.add_argument("--export", help="stream the full ranked list to a .jsonl or .csv file")
+    args = parser.parse_args()
+    filters = {"types": args.type, "difficulties": args.difficulty}
+
+    if args.export:
+        n = export_recommendations(args.export, **filters)
+        print(f"Wrote {n} targets to {args.export}")
+        raise SystemExit
+
     obs = get_observer_tonight()
     viewing_time = ephem_to_local(obs.date).strftime("%-I:%M %p")
     print(f"=== Tonight's Top Targets (calculated for {viewing_time}) ===\n")
 
-    targets = get_recommendations()
+    table = score_targets()
+    good_targets = table.top(args.top, min_score=args.min_score, **filters)
 
-    # Filter to 6+ and take top 5
-    good_targets = [t for t in targets if t["score"] >= 6][:5]
-
-    if not good_targets:
-        print("No targets scoring 6+ right now")
+    if not len(good_targets):
+        print(f"No targets scoring {args.min_score:g}+ right now")
         print("\nBest available:")
-        for t in targets[:3]:
+        for t in table.top(3, **filters):
             if t["visible"]:
                 print(f"  {t['name']} - Score: {t['score']}/10")
     else:
@@ -309,3 +500,8 @@ if __name__ == "__main__":
             print(f"{i}. {t['name']} [{t['score']}/10]")
             print(f"   Alt: {t['altitude']}° | Moon sep: {t['moon_separation']}°")
             print()
+
+    print("Planets tonight:")
+    for p in get_night_planets():
+        if p["visible"]:
+            print(f"  {p['name']}: up to {p['altitude']}° at {p['transit_time']} ({p['hours_up']}h above 10°)")
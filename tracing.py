@@ -0,0 +1,133 @@
+"""Lightweight tracing spans and metrics for the pipeline stages.
+
+Spans time a block of work and carry attributes (HTTP status, bytes...).
+Counters and gauges collect totals such as ephem calls or catalog size.
+Everything is kept in memory for the run and exported as JSON lines and as
+a Prometheus textfile (node_exporter textfile collector format).
+"""
+
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_spans = []
+_counters = {}
+_gauges = {}
+RUN_ID = uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block; yields the span's attribute dict so callers can add to it."""
+    record = {"span": name, "start": time.time(), "thread": threading.current_thread().name, **attrs}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration_s"] = time.perf_counter() - start
+        with _lock:
+            _spans.append(record)
+
+
+def count(name: str, value: float = 1):
+    """Add to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name: str, value: float):
+    """Set a gauge to its latest value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def reset():
+    """Forget everything recorded so far (e.g. between daemon cycles)."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def get_spans() -> list:
+    with _lock:
+        return list(_spans)
+
+
+def durations() -> dict:
+    """Total seconds per span name."""
+    totals = {}
+    for record in get_spans():
+        totals[record["span"]] = totals.get(record["span"], 0.0) + record["duration_s"]
+    return totals
+
+
+def export_jsonl(path: str):
+    """Append this run's spans and metrics to a JSON lines file."""
+    with _lock:
+        lines = [{"run": RUN_ID, "type": "span", **s} for s in _spans]
+        lines += [{"run": RUN_ID, "type": "counter", "name": k, "value": v} for k, v in _counters.items()]
+        lines += [{"run": RUN_ID, "type": "gauge", "name": k, "value": v} for k, v in _gauges.items()]
+    with open(path, "a") as f:
+        for line in lines:
+            f.write(json.dumps(line, default=str) + "\n")
+
+
+def _metric_name(name: str) -> str:
+    return "clearskies_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def export_prometheus(path: str):
+    """Write a Prometheus textfile with span durations, counters and gauges."""
+    lines = [
+        "# HELP clearskies_span_seconds Wall time of each pipeline stage in the last run.",
+        "# TYPE clearskies_span_seconds gauge",
+    ]
+    for name, seconds in sorted(durations().items()):
+        lines.append(f'clearskies_span_seconds{{span="{name}"}} {seconds:.6f}')
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+    for name, value in sorted(counters.items()):
+        metric = _metric_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, value in sorted(gauges.items()):
+        metric = _metric_name(name)
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    lines += ["# TYPE clearskies_last_run_timestamp_seconds gauge",
+              f"clearskies_last_run_timestamp_seconds {time.time():.0f}"]
+
+    # Write then rename so the collector never reads a half-written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def export(jsonl_path: str | None = None, textfile: str | None = None):
+    """Export to whichever destinations are configured."""
+    if jsonl_path:
+        export_jsonl(jsonl_path)
+    if textfile:
+        export_prometheus(textfile)
+
+
+@contextmanager
+def profiled(path: str | None):
+    """Capture a cProfile of the block into `path` (no-op when path is None)."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
@@ -1,82 +1,240 @@
 """Weather data from Open-Meteo API."""
 
-import requests
-import pytz
-from datetime import datetime, timezone
-import ephem
-from config import LATITUDE, LONGITUDE, TIMEZONE
+import hashlib
+import json
+import os
+import time
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+from config import (
+    TIMEZONE, OPENMETEO_URL, CACHE_DIR, FORECAST_TTL_MINUTES, MODEL_CYCLE_HOURS, FORECAST_STALE_MAX_HOURS,
+    HTTP_TIMEOUT, HTTP_RETRIES, FORECAST_BATCH,
+)
+from night import NightContext, ephem_to_local, get_night_context
+
+if TYPE_CHECKING:
+    import requests  # Annotations only; imported lazily at runtime to keep cloudy runs light
+
+HOURLY_VARIABLES = "cloud_cover,relative_humidity_2m,visibility,wind_speed_10m,temperature_2m"
+
+_session = None
+
+
+def get_session() -> "requests.Session":
+    """Shared HTTP session with a connection pool and retry/backoff."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=0.5,  # 0.5s, 1s, 2s...
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        _session = requests.Session()
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def current_model_run(now: datetime | None = None) -> str:
+    """Identifier of the forecast model cycle in effect (e.g. 2024-06-01T12Z)."""
+    now = now or datetime.now(timezone.utc)
+    hour = now.hour - now.hour % MODEL_CYCLE_HOURS
+    return f"{now:%Y-%m-%d}T{hour:02d}Z"
+
+
+def _cache_path(params: dict) -> str:
+    """Cache file for a request: one per (lat, lon, variables, options)."""
+    key = json.dumps(params, sort_keys=True, default=str)
+    return os.path.join(CACHE_DIR, f"forecast-{hashlib.sha1(key.encode()).hexdigest()[:16]}.json")
+
+
+def _read_cache(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-OPENMETEO_URL = "https://api.open-meteo.com/v1/forecast"
-LOCAL_TZ = pytz.timezone(TIMEZONE)
 
+def _write_cache(path: str, entry: dict):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Forecast cache write failed: {e}")
+
+
+def fetch_forecast(params: dict, url: str = OPENMETEO_URL) -> dict:
+    """Fetch an Open-Meteo forecast through the on-disk cache.
+
+    A cached response from the current model run younger than
+    FORECAST_TTL_MINUTES is returned without any request. Older entries are
+    revalidated with ETag/Last-Modified, and a 304 reuses the cached body.
+    If the network fails, a cached forecast up to FORECAST_STALE_MAX_HOURS
+    old is returned.
+
+    Raises:
+        requests.RequestException if the request fails and nothing recent enough is cached
+    """
+    path = _cache_path(params)
+    entry = _read_cache(path)
+    run = current_model_run()
 
-def ephem_to_local(ephem_date) -> datetime:
-    """Convert ephem date to local timezone datetime."""
-    utc_dt = ephem.Date(ephem_date).datetime().replace(tzinfo=pytz.UTC)
-    return utc_dt.astimezone(LOCAL_TZ)
+    if entry and entry["model_run"] == run and time.time() - entry["fetched"] < FORECAST_TTL_MINUTES * 60:
+        tracing.count("forecast_cache_hits")
+        return entry["data"]
 
+    import requests  # Deferred: a fresh cache hit never needs the HTTP stack
 
-def get_viewing_hour() -> int:
-    """Get the hour (0-23) for tonight's viewing time (2hrs after sunset)."""
-    obs = ephem.Observer()
-    obs.lat = str(LATITUDE)
-    obs.lon = str(LONGITUDE)
-    obs.date = datetime.now(timezone.utc)
-
-    sun = ephem.Sun()
-    sunset = obs.next_setting(sun)
-    viewing_time = ephem_to_local(ephem.Date(sunset + 2 * ephem.hour))
-    return viewing_time.hour
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
 
+    try:
+        with tracing.span("http.openmeteo", conditional=bool(headers)) as record:
+            response = get_session().get(url, params=params, headers=headers, timeout=HTTP_TIMEOUT)
+            record["status"] = response.status_code
+            record["bytes"] = len(response.content)
+        tracing.count("http_requests")
+        tracing.count("http_bytes", len(response.content))
+        if response.status_code == 304 and entry:
+            tracing.count("forecast_cache_revalidated")
+            data = entry["data"]
+        else:
+            response.raise_for_status()
+            data = response.json()
+    except requests.RequestException as e:
+        tracing.count("http_errors")
+        if entry and time.time() - entry["fetched"] < FORECAST_STALE_MAX_HOURS * 3600:
+            print(f"Forecast fetch failed, using cached copy: {e}")
+            return entry["data"]
+        raise
+
+    previous = entry or {}
+    _write_cache(path, {
+        "fetched": time.time(),
+        "model_run": run,
+        "etag": response.headers.get("ETag") or previous.get("etag"),
+        "last_modified": response.headers.get("Last-Modified") or previous.get("last_modified"),
+        "data": data,
+    })
+    return data
+
+
+def get_viewing_hour(ctx: NightContext | None = None) -> int:
+    """Get the hour (0-23) for tonight's viewing time (2hrs after sunset)."""
+    ctx = ctx or get_night_context()
+    return ephem_to_local(ctx.viewing_time).hour
 
-def get_weather() -> dict | None:
-    """Fetch weather forecast for tonight's viewing time.
 
-    Returns:
-        dict with cloud_cover, humidity, visibility_mi, wind_mph, temperature_f, forecast_hour
-        or None if request fails
-    """
-    params = {
-        "latitude": LATITUDE,
-        "longitude": LONGITUDE,
-        "hourly": "cloud_cover,relative_humidity_2m,visibility,wind_speed_10m,temperature_2m",
+def forecast_params(lat: float, lon: float, days: int = 2) -> dict:
+    """Open-Meteo query for the hourly variables we score on."""
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": HOURLY_VARIABLES,
         "temperature_unit": "fahrenheit",
         "wind_speed_unit": "mph",
         "timezone": TIMEZONE,
-        "forecast_days": 2,
+        "forecast_days": days,
     }
 
-    try:
-        response = requests.get(OPENMETEO_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
 
-        hourly = data["hourly"]
-        times = hourly["time"]
+def hourly_row(hourly: dict, idx: int) -> dict:
+    """Weather dict for one index of the hourly arrays."""
+    return {
+        "cloud_cover": hourly["cloud_cover"][idx],  # %
+        "humidity": hourly["relative_humidity_2m"][idx],  # %
+        "visibility_mi": hourly["visibility"][idx] / 1609.34,  # convert m to miles
+        "wind_mph": hourly["wind_speed_10m"][idx],  # mph
+        "temperature_f": hourly["temperature_2m"][idx],  # fahrenheit
+        "forecast_hour": hourly["time"][idx],
+    }
 
-        # Find tonight's viewing hour (in local timezone)
-        viewing_hour = get_viewing_hour()
-        today = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d")
-        target_time = f"{today}T{viewing_hour:02d}:00"
 
-        # Find index for target time
+def window_indices(times: list, start, end) -> list:
+    """Indices of the hourly slots (local time strings) covering [start, end] ephem dates."""
+    first = ephem_to_local(start).replace(minute=0, second=0, microsecond=0)
+    last = ephem_to_local(end)
+    wanted = set()
+    slot = first
+    while slot <= last:
+        wanted.add(slot.strftime("%Y-%m-%dT%H:00"))
+        slot += timedelta(hours=1)
+    return [i for i, t in enumerate(times) if t in wanted]
+
+
+def fetch_forecasts(coords: list, days: int = 2, batch: int = FORECAST_BATCH) -> list:
+    """Hourly forecasts for many (lat, lon) pairs, `batch` coordinates per request.
+
+    Open-Meteo takes comma-separated coordinate lists and answers with one
+    forecast per pair, in order. Batches are fetched concurrently through
+    the cached session; a failed batch leaves None for its sites.
+    """
+    chunks = [coords[i:i + batch] for i in range(0, len(coords), batch)]
+
+    def fetch(chunk):
+        params = forecast_params(",".join(str(lat) for lat, _ in chunk),
+                                 ",".join(str(lon) for _, lon in chunk), days)
         try:
-            idx = times.index(target_time)
-        except ValueError:
-            # Fallback to first evening hour available
-            idx = viewing_hour
-
-        return {
-            "cloud_cover": hourly["cloud_cover"][idx],  # %
-            "humidity": hourly["relative_humidity_2m"][idx],  # %
-            "visibility_mi": hourly["visibility"][idx] / 1609.34,  # convert m to miles
-            "wind_mph": hourly["wind_speed_10m"][idx],  # mph
-            "temperature_f": hourly["temperature_2m"][idx],  # fahrenheit
-            "forecast_hour": times[idx],
-        }
+            data = fetch_forecast(params)
+        except Exception as e:
+            print(f"Forecast batch failed ({len(chunk)} sites): {e}")
+            return [None] * len(chunk)
+        # One location comes back as an object, several as a list
+        return data if isinstance(data, list) else [data]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        return [forecast for result in pool.map(fetch, chunks) for forecast in result]
+
+
+def viewing_row(hourly: dict, ctx: NightContext) -> dict | None:
+    """Weather dict for the forecast hour containing ctx's viewing time.
+
+    Returns None if the forecast doesn't cover that hour (e.g. an old cached
+    copy), so it is never mistaken for tonight's weather.
+    """
+    # Find tonight's viewing hour (in local timezone)
+    target_time = ephem_to_local(ctx.viewing_time).strftime("%Y-%m-%dT%H:00")
+    try:
+        idx = hourly["time"].index(target_time)
+    except ValueError:
+        return None
+    return hourly_row(hourly, idx)
+
+
+def get_weather(ctx: NightContext | None = None) -> dict | None:
+    """Fetch weather forecast for tonight's viewing time.
+
+    Returns:
+        dict with cloud_cover, humidity, visibility_mi, wind_mph, temperature_f, forecast_hour
+        or None if the request fails or the forecast doesn't cover tonight
+    """
+    ctx = ctx or get_night_context()
+    params = forecast_params(ctx.lat, ctx.lon)
+
+    try:
+        data = fetch_forecast(params)
+        row = viewing_row(data["hourly"], ctx)
     except Exception as e:
         print(f"Weather fetch failed: {e}")
         return None
+    if row is None:
+        print("Forecast doesn't cover tonight's viewing hour")
+    return row
 
 
 if __name__ == "__main__":